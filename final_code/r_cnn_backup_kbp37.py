@@ -10,6 +10,9 @@ if (sys.version_info > (3, 0)):
 else: #Python 2.7 imports
     import cPickle as pkl
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pytorch_code'))
+from dataset import loadDataset
+
 
 batch_size = 128
 nb_epoch = 200
@@ -26,11 +29,11 @@ conv_dims = 1*embedding_dims + 0*position_dims + 2*lstm_output_dims
 log_interval = 10
 
 penalty = 0
+#Pooling of the conv1 features over the sentence, 'max' or the class 'attention' of Up and W
+pooling = 'attention'
 
 print("Load dataset")
-f = gzip.open('./pkl/sem-relations-sdp-kbp37-19.pkl.gz', 'rb')
-data = pkl.load(f)
-f.close()
+data = loadDataset('./pkl/sem-relations-sdp-kbp37-19')
 
 embeddings = data['wordEmbeddings']
 yTrain, sentenceTrain, resentenceTrain, positionTrain1, positionTrain2, \
@@ -39,6 +42,8 @@ yTest, sentenceTest, resentenceTest, positionTest1, positionTest2, \
         repositionTest1, repositionTest2, sdpTest, resdpTest = data['test_set']
 
 n_out = 19
+#Label of the Other class in KBP37
+other = 0
 max_sentence_len = sentenceTrain.shape[1]
 max_position = int(max(np.max(positionTrain1), np.max(positionTrain2)) + 1)
 
@@ -59,14 +64,21 @@ import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
 import torch.utils.data as D
+from batches import FieldDataset, toDevice
+from ranking import RankingLoss, RankingMetrics
 import random
 #from logger import Logger
 embedding = nn.Embedding(embeddings.shape[0], embeddings.shape[1]).cuda()
 embedding.weight.data.copy_(torch.from_numpy(embeddings))
 
 class CnnOneAttNet(nn.Module):
-    def __init__(self):
+    poolings = ['max', 'attention']
+
+    def __init__(self, pooling='max'):
         super(CnnOneAttNet, self).__init__()
+        if pooling not in self.poolings:
+            raise ValueError("Unknown pooling %s, use one of %s" % (pooling, ", ".join(self.poolings)))
+        self.pooling = pooling
 
         #bi-lstm layer
         #self.lstm = nn.GRU(lstm_input_dims, lstm_output_dims, batch_first=True, dropout=0, bidirectional=True)
@@ -88,7 +100,7 @@ class CnnOneAttNet(nn.Module):
         self.M = nn.Parameter(nn.init.xavier_uniform(torch.Tensor(max_sentence_len, n_out)), requires_grad=True)
 
 
-    def forward(self, words, pos1, pos2, sdp, labels, mask, idx, indices):
+    def forward(self, words, pos1, pos2, sdp):
         embedw = self.drope(embedding(words))
         
         ##lstm
@@ -100,129 +112,75 @@ class CnnOneAttNet(nn.Module):
         
         H = torch.cat((u*output1, u*embedw, u*output2), 2).permute(0, 2, 1)
         x1 = F.tanh(self.conv1(H))
-        G = torch.matmul(x1.permute(0, 2, 1), self.Up)
-        G = torch.matmul(G, self.W)
-        A = F.softmax(G, 1)
-        x1 = torch.max(torch.bmm(x1, A), 2)[0].view(x1.shape[0], -1)
-        #x1 = torch.max(F.tanh(self.conv1(H)), 2)[0].view(x1.shape[0], -1)
+        if self.pooling == 'attention':
+            G = torch.matmul(x1.permute(0, 2, 1), self.Up)
+            G = torch.matmul(G, self.W)
+            A = F.softmax(G, 1)
+            x1 = torch.max(torch.bmm(x1, A), 2)[0]
+        else:
+            x1 = torch.max(x1, 2)[0]
 
         x = self.drop(x1)
 
-        s1 = self.W[:,labels]
-        s1 = torch.diag(torch.matmul(x, s1))
-        s1 = torch.log(1 + torch.exp(2 * (2.5 - s1)))
-        s1 = s1.masked_fill_(idx.byte(), 0)
-        
-        s2 = torch.zeros_like(s1)
-
         x = torch.matmul(x, self.W)
-        s4 = torch.masked_select(x, mask.byte()).view(x.shape[0], -1)
-        s3 = torch.index_select(s4, 1, indices)
-        s3 = s3 * (1 - idx).view(-1, 1).float()
-        s3 = torch.max(s3, 1)[0]
-        s3 = torch.log(1 + torch.exp(2 * (0.5 + s3)))
-        s2 = s2.add_(s3)
-
-        s3 = s4 * idx.view(-1, 1).float()
-        s3 = torch.max(s3, 1)[0]
-        s3 = torch.log(1 + torch.exp(2 * (0.5 + s3)))
-        s2 = s2.add_(s3)
-        return s1, s2, x
-
-model = CnnOneAttNet().cuda()
+        return x
+
+model = CnnOneAttNet(pooling).cuda()
+criterion = RankingLoss(other)
 #optimizer = optim.Adadelta(model.parameters(), lr=1, weight_decay=1e-4)
 #optimizer = optim.SGD(model.parameters(), lr=5e-2, weight_decay=1e-3)
 optimizer = optim.Adam(model.parameters(), lr=1e-3, weight_decay=1e-3)
 scheduler = optim.lr_scheduler.MultiStepLR(optimizer, milestones=[100,150], gamma=0.1)
 print(model)
 
-train_cat = torch.from_numpy(np.concatenate((sentenceTrain, resentenceTrain, positionTrain1, positionTrain2, \
-        repositionTrain1, repositionTrain2, sdpTrain, resdpTrain), axis=1))
-train_datasets = D.TensorDataset(data_tensor=train_cat, target_tensor=torch.LongTensor(yTrain))
-train_dataloader = D.DataLoader(train_datasets, batch_size, True)
-
-test_cat = torch.from_numpy(np.concatenate((sentenceTest, resentenceTest, positionTest1, positionTest2, \
-        repositionTest1, repositionTest2, sdpTest, resdpTest), axis=1))
-test_datasets = D.TensorDataset(data_tensor=test_cat, target_tensor=torch.LongTensor(yTest))
-test_dataloader = D.DataLoader(test_datasets, batch_size, False)
-
-
-def data_unpack(cat_data, target):
-    list_x = np.split(cat_data.numpy(), [max_sentence_len, max_sentence_len*2, \
-            max_sentence_len*3, max_sentence_len*4, max_sentence_len*5, max_sentence_len*6, \
-            max_sentence_len*7, max_sentence_len*8], 1)
-    sen = Variable(torch.from_numpy(list_x[0])).cuda()
-    resen = Variable(torch.from_numpy(list_x[1])).cuda()
-    pos1 = Variable(torch.from_numpy(list_x[2])).cuda()
-    pos2 = Variable(torch.from_numpy(list_x[3])).cuda()
-    repos1 = Variable(torch.from_numpy(list_x[4])).cuda()
-    repos2 = Variable(torch.from_numpy(list_x[5])).cuda()
-    sdp = Variable(torch.from_numpy(list_x[6])).cuda()
-    resdp = Variable(torch.from_numpy(list_x[7])).cuda()
-    list_y = np.split(target.numpy(), [1, 2], 1)
-    label = Variable(torch.from_numpy(list_y[0]).squeeze(1)).cuda()
-    relabel = Variable(torch.from_numpy(list_y[1]).squeeze(1)).cuda()
-
-    idx = np.ones((sen.shape[0], n_out))
-    idx[np.arange(idx.shape[0]), list_y[0].reshape(1,-1)] = 0
-    mask = Variable(torch.from_numpy(idx)).cuda()
-    idx = np.zeros((sen.shape[0]))
-    idx[np.where(np.array(list_y[0]).reshape(-1)==0)] = 1
-    idx = Variable(torch.from_numpy(idx)).cuda()
-    indices = Variable(torch.LongTensor([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17])).cuda()
-    return sen, resen, pos1, pos2, repos1, repos2, sdp, resdp, label, relabel, mask, idx, indices
-
-
-def data_unpack_reverse(cat_data, target):
-    list_x = np.split(cat_data.numpy(), [max_sentence_len, max_sentence_len*2, \
-            max_sentence_len*3, max_sentence_len*4, max_sentence_len*5, max_sentence_len*6, \
-            max_sentence_len*7, max_sentence_len*8], 1)
-    sen = Variable(torch.from_numpy(np.concatenate((list_x[0], list_x[1]), axis=0))).cuda()
-    resen = Variable(torch.from_numpy(list_x[1])).cuda()
-    pos1 = Variable(torch.from_numpy(np.concatenate((list_x[2], list_x[4]), axis=0))).cuda()
-    pos2 = Variable(torch.from_numpy(np.concatenate((list_x[3], list_x[5]), axis=0))).cuda()
-    repos1 = Variable(torch.from_numpy(list_x[4])).cuda()
-    repos2 = Variable(torch.from_numpy(list_x[5])).cuda()
-    sdp = Variable(torch.from_numpy(np.concatenate((list_x[6], list_x[7]), axis=0))).cuda()
-    resdp = Variable(torch.from_numpy(list_x[7])).cuda()
-    list_y = np.split(target.numpy(), [1], 1)
-    label = Variable(torch.from_numpy(np.concatenate((list_y[0], list_y[1]), axis=0)).squeeze(1)).cuda()
-    relabel = Variable(torch.from_numpy(list_y[1]).squeeze(1)).cuda()
-    
-    idx = np.ones((sen.shape[0], n_out))
-    idx[np.arange(idx.shape[0]), np.array(target.numpy()).reshape(-1)] = 0
-    mask = Variable(torch.from_numpy(idx)).cuda()
-    idx = np.zeros((sen.shape[0]))
-    idx[np.where(np.array(list_y).reshape(-1)==0)] = 1
-    idx = Variable(torch.from_numpy(idx)).cuda()
-    indices = Variable(torch.LongTensor([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17])).cuda()
-    return sen, resen, pos1, pos2, repos1, repos2, sdp, resdp, label, relabel, mask, idx, indices
+def fieldDataset(y, sentence, resentence, position1, position2, reposition1, reposition2, sdp, resdp):
+    """Returns the fields of a set as a FieldDataset, the sdp weights stay float"""
+    return FieldDataset([('sentences', sentence, 'int64'), ('resentences', resentence, 'int64'),
+                         ('pos1', position1, 'int64'), ('pos2', position2, 'int64'),
+                         ('repos1', reposition1, 'int64'), ('repos2', reposition2, 'int64'),
+                         ('sdp', sdp, 'float32'), ('resdp', resdp, 'float32'),
+                         ('labels', y[:,0], 'int64'), ('relabels', y[:,1], 'int64')])
+
+train_datasets = fieldDataset(yTrain, sentenceTrain, resentenceTrain, positionTrain1, positionTrain2, \
+        repositionTrain1, repositionTrain2, sdpTrain, resdpTrain)
+test_datasets = fieldDataset(yTest, sentenceTest, resentenceTest, positionTest1, positionTest2, \
+        repositionTest1, repositionTest2, sdpTest, resdpTest)
+
+
+def data_unpack(batch):
+    sen, resen, pos1, pos2, repos1, repos2, sdp, resdp, label, relabel = toDevice(batch)
+    return sen, resen, pos1, pos2, repos1, repos2, sdp, resdp, label, relabel
+
+
+def data_unpack_reverse(batch):
+    batch = toDevice(batch)
+    sen = torch.cat((batch.sentences, batch.resentences), 0)
+    pos1 = torch.cat((batch.pos1, batch.repos1), 0)
+    pos2 = torch.cat((batch.pos2, batch.repos2), 0)
+    sdp = torch.cat((batch.sdp, batch.resdp), 0)
+    label = torch.cat((batch.labels, batch.relabels), 0)
+    return sen, batch.resentences, pos1, pos2, batch.repos1, batch.repos2, sdp, batch.resdp, \
+            label, batch.relabels
 
 def train(epoch):
     model.train()
-    correct = 0
+    metrics = RankingMetrics(n_out, other, penalty)
         
-    for i, (sen, lab) in enumerate(train_dataloader):
+    for i, batch in enumerate(train_datasets.batches(batch_size, shuffle=True)):
         sentences, resentences, pos1, pos2, repos1, repos2, \
-                sdp, resdp, labels, relabels, mask, idx, indices = data_unpack(sen, lab)
-        output1, output2, output = model(sentences, pos1, pos2, sdp, labels, mask, idx, indices)
-        #print(output1.view(1, -1), output2.view(1, -1))
-        loss = torch.mean(output1 + output2)
-        #loss = F.cross_entropy(output1, labels)# + F.cross_entropy(output2, relabels)
+                sdp, resdp, labels, relabels = data_unpack(batch)
+        output = model(sentences, pos1, pos2, sdp)
+        loss = criterion(output, labels)
         optimizer.zero_grad()
         loss.backward()
         optimizer.step()
-        
-        value, pred = output.data.max(1, keepdim=True)
-        for idx, num in enumerate(value):
-            if num.cpu().numpy() <= penalty:
-                pred[idx] = 0
-        correct += pred.eq(labels.data.view_as(pred)).long().cpu().sum()
+        metrics.add(output.data, labels.data)
         if i % log_interval == 0:
             print('Train Epoch: {} [{}/{} ({:.0f}%)]\tLoss: {:.6f}'.format(
                 epoch+1, int(i) * len(sentences), sentenceTrain.shape[0],
                 100. * int(i) * len(sentences) / len(sentenceTrain), loss.data[0]))
-    print('\nTrain set: Accuracy:{:.4f}%'.format(100. * correct / sentenceTrain.shape[0]))
+    prediction, confusion = metrics.results()
+    print('\nTrain set: Accuracy:{:.4f}%'.format(100. * np.trace(confusion) / sentenceTrain.shape[0]))
 
 from sklearn.metrics import precision_recall_fscore_support
 max_prec, max_rec, max_acc, max_f1 = 0, 0, 0, 0
@@ -232,32 +190,25 @@ labelsMapping = {}
 def test(epoch):
     model.eval()
     test_loss = 0
-    correct = 0
-    prediction = np.zeros(yTest.shape[0])
+    metrics = RankingMetrics(n_out, other, penalty)
        
-    for i, (sen, lab) in enumerate(test_dataloader):
+    for i, batch in enumerate(test_datasets.batches(batch_size)):
         sentences, resentences, pos1, pos2, repos1, repos2, \
-                sdp, resdp, labels, relabels, mask, idx, indices = data_unpack(sen, lab)
-        output1, output2, output = model(sentences, pos1, pos2, sdp, labels, mask, idx, indices)
-        test_loss += F.cross_entropy(output, labels).data[0]
-        value, pred = output.data.max(1, keepdim=True)
-        for idx, num in enumerate(value):
-            if num.cpu().numpy() <= penalty:
-                pred[idx] = 0
-        correct += pred.eq(labels.data.view_as(pred)).long().cpu().sum()
-        prediction[i*batch_size:min((i+1)*batch_size,yTest.shape[0])] = pred.squeeze(1).cpu().numpy()
-
-    test_loss /= sentenceTest.shape[0]
+                sdp, resdp, labels, relabels = data_unpack(batch)
+        output = model(sentences, pos1, pos2, sdp)
+        test_loss += F.cross_entropy(output, labels).data
+        metrics.add(output.data, labels.data)
+    prediction, confusion = metrics.results()
+    correct = np.trace(confusion)
+
+    test_loss = test_loss[0] / sentenceTest.shape[0]
     print('\nTest set: Average loss: {:.4f}, Accuracy: {}/{} ({:.0f}%)\n'.format(
         test_loss, correct, sentenceTest.shape[0],
         100. * correct / sentenceTest.shape[0]))
     
     global max_acc, max_rec, max_prec, max_f1, max_f1_epoch, max_prec_epoch
     
-    err = 0
-    for i in range(len(prediction)-1):
-        if yTest[:,0].squeeze()[i] != prediction[i] and prediction[i] == 0:
-            err += 1
+    err = np.sum(confusion[:,other]) - confusion[other,other]
             
     print("Err Other:", err)
 
@@ -0,0 +1,85 @@
+"""
+Batches over the fields of a set, every field its own typed tensor.
+
+Concatenating all fields of a set into one matrix for D.TensorDataset and
+splitting every batch back with np.split copies each batch through numpy and
+coerces the float SDP weights to the dtype of the token ids. FieldDataset keeps
+one tensor per field instead, in the narrow dtype the field is stored in, and
+hands out batches as a namedtuple of those fields, each cast to the dtype the
+model reads:
+
+    trainSet = FieldDataset([('sentences', sentenceTrain, 'int64'), ('sdp', sdpTrain, 'float32'),
+                             ('labels', yTrain[:,0], 'int64')])
+    for batch in trainSet.batches(batch_size, shuffle=True):
+        model(batch.sentences, batch.sdp)
+
+Batches in order are narrowed views of the field tensors, shuffled batches are
+gathered with one index_select per field. Only the batch is widened, so the set
+stays as small in memory as on disk.
+"""
+import collections
+
+import numpy as np
+import torch
+import torch.utils.data as D
+from torch.autograd import Variable
+
+#Tensor types of the numpy dtypes torch.from_numpy takes
+tensorTypes = {'uint8': 'torch.ByteTensor', 'int8': 'torch.CharTensor', 'int16': 'torch.ShortTensor',
+               'int32': 'torch.IntTensor', 'int64': 'torch.LongTensor', 'float16': 'torch.HalfTensor',
+               'float32': 'torch.FloatTensor', 'float64': 'torch.DoubleTensor'}
+#Stored dtypes torch has no tensor for, or like float16 few CPU operations, and the narrowest dtype to read them as
+tensorDtypes = {'uint16': 'int32', 'uint32': 'int64', 'bool': 'uint8', 'float16': 'float32'}
+
+
+class FieldDataset(D.Dataset):
+    """Set of named fields with the examples along the first dimension
+
+    fields is a list of (name, array, dtype) triples. Every array is read into a
+    tensor of its own dtype once, the memory-mapped arrays of loadDataset in their
+    stored dtype, and the rows of a batch are cast to dtype. Indexing returns a
+    Batch of the rows of every field.
+    """
+
+    def __init__(self, fields):
+        names = [name for name, array, dtype in fields]
+        self.Batch = collections.namedtuple('Batch', names)
+        self.fields = self.Batch(*[torch.from_numpy(self.tensorArray(array)) for name, array, dtype in fields])
+        self.types = [tensorTypes[np.dtype(dtype).name] for name, array, dtype in fields]
+        lengths = set(len(field) for field in self.fields)
+        if len(lengths) != 1:
+            raise ValueError("The fields %s differ in their number of examples" % ", ".join(names))
+
+    @staticmethod
+    def tensorArray(array):
+        """Returns the array in memory in its dtype, or the narrowest wider one torch has a tensor for"""
+        array = np.asarray(array)
+        return np.array(array, dtype=tensorDtypes.get(array.dtype.name, array.dtype))
+
+    def __len__(self):
+        return len(self.fields[0])
+
+    def batch(self, rows):
+        """Returns the Batch of the rows of every field, cast to the dtype of the field"""
+        return self.Batch(*[row.type(tensorType) if torch.is_tensor(row) else row
+                            for row, tensorType in zip(rows, self.types)])
+
+    def __getitem__(self, index):
+        return self.batch([field[index] for field in self.fields])
+
+    def batches(self, batchSize, shuffle=False):
+        """Yields the Batches of at most batchSize examples, in a new random order every call if shuffle"""
+        if shuffle:
+            order = torch.randperm(len(self))
+            for start in range(0, len(self), batchSize):
+                index = order[start:start+batchSize]
+                yield self.batch([field.index_select(0, index) for field in self.fields])
+        else:
+            for start in range(0, len(self), batchSize):
+                size = min(batchSize, len(self) - start)
+                yield self.batch([field.narrow(0, start, size) for field in self.fields])
+
+
+def toDevice(batch, cuda=True):
+    """Returns the Batch with every field wrapped in a Variable, on the GPU if cuda"""
+    return batch.__class__(*[Variable(field.cuda() if cuda else field) for field in batch])
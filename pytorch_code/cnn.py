@@ -10,6 +10,8 @@ if (sys.version_info > (3, 0)):
 else: #Python 2.7 imports
     import cPickle as pkl
 
+from dataset import loadDataset, Batches
+
 
 batch_size = 64
 test_batch_size = 2717
@@ -24,9 +26,7 @@ log_interval = 10
 learning_rate = 0.0001
 
 print("Load dataset")
-f = gzip.open('pkl/sem-relations.pkl.gz', 'rb')
-data = pkl.load(f)
-f.close()
+data = loadDataset('pkl/sem-relations')
 
 embeddings = data['wordEmbeddings']
 yTrain, sentenceTrain, positionTrain1, positionTrain2, positionIndexTrain = data['train_set']
@@ -93,12 +93,8 @@ indexes = range(sentenceTrain.shape[0])
 random.shuffle(indexes)
 test_indexes = range(sentenceTest.shape[0])
 random.shuffle(test_indexes)
-def generate(data, batch_size, indexes):    
-    data_for_batch = []
-    for i in range(data.shape[0]/batch_size):
-        index_for_batch = indexes[batch_size*i:min(data.shape[0], batch_size*(i+1))]
-        data_for_batch.append(data[index_for_batch])
-    return data_for_batch 
+def generate(data, batch_size, indexes):
+    return Batches(data, batch_size, indexes)
 
 
 def train(epoch):
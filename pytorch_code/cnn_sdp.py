@@ -10,6 +10,9 @@ if (sys.version_info > (3, 0)):
 else: #Python 2.7 imports
     import cPickle as pkl
 
+from dataset import loadDataset, Batches
+from preprocessing import PipelinedDataset, labelsMapping, minDistance, maxDistance
+
 
 batch_size = 64
 test_batch_size = 2717
@@ -24,33 +27,42 @@ class_dims = 10
 log_interval = 10
 learning_rate = 0.0001
 multiple = 0.01
+#Start training while pkl/sem-relations is still preprocessed, the first epoch
+#trains on the chunks of the train set as soon as they are parsed
+pipelined = False
 
 print("Load dataset")
-f = gzip.open('pkl/sem-relations.pkl.gz', 'rb')
-data = pkl.load(f)
-f.close()
-
-embeddings = data['wordEmbeddings']
-yTrain, sentenceTrain, positionTrain1, positionTrain2, positionIndexTrain, sdpWeightTrain = data['train_set']
-yTest, sentenceTest, positionTest1, positionTest2, positionIndexTest, sdpWeightTest  = data['test_set']
-
-max_position = max(np.max(positionTrain1), np.max(positionTrain2))+1
-
-n_out = max(yTrain)+1
-max_sentence_len = sentenceTrain.shape[1]
-max_prec, max_rec, max_acc, max_f1 = 0,0,0,0
-
-print("sentenceTrain: ", sentenceTrain.shape)
-print("positionTrain1: ", positionTrain1.shape)
-print("positionTrain2: ", positionTrain2.shape)
-print("yTrain: ", yTrain.shape)
-print("positionIndexTrain: ", positionIndexTrain.shape)
-print("sentenceTest: ", sentenceTest.shape)
-print("positionTest1: ", positionTest1.shape)
-print("positionTest2: ", positionTest2.shape)
-print("yTest: ", yTest.shape)
-print("positionIndexTest: ", positionIndexTest.shape)
+if pipelined:
+    #generate() drops the last partial batch of every chunk, the chunks are whole batches
+    data = PipelinedDataset('sem-relations', streamLines=16*batch_size)
+    embeddings = data.wordEmbeddings
+    max_position = maxDistance - minDistance + 4
+    n_out = len(labelsMapping)
+    max_sentence_len = data.width
+else:
+    data = loadDataset('pkl/sem-relations')
+
+    embeddings = data['wordEmbeddings']
+    yTrain, sentenceTrain, positionTrain1, positionTrain2, positionIndexTrain, sdpWeightTrain = data['train_set']
+    yTest, sentenceTest, positionTest1, positionTest2, positionIndexTest, sdpWeightTest  = data['test_set']
+
+    max_position = max(np.max(positionTrain1), np.max(positionTrain2))+1
+
+    n_out = max(yTrain)+1
+    max_sentence_len = sentenceTrain.shape[1]
+
+    print("sentenceTrain: ", sentenceTrain.shape)
+    print("positionTrain1: ", positionTrain1.shape)
+    print("positionTrain2: ", positionTrain2.shape)
+    print("yTrain: ", yTrain.shape)
+    print("positionIndexTrain: ", positionIndexTrain.shape)
+    print("sentenceTest: ", sentenceTest.shape)
+    print("positionTest1: ", positionTest1.shape)
+    print("positionTest2: ", positionTest2.shape)
+    print("yTest: ", yTest.shape)
+    print("positionIndexTest: ", positionIndexTest.shape)
 print("Embeddings: ",embeddings.shape)
+max_prec, max_rec, max_acc, max_f1 = 0,0,0,0
 
 import torch
 from torch.autograd import Variable
@@ -122,16 +134,26 @@ optimizer = optim.Adam(model.parameters(), lr=learning_rate)
 #    print(type(param.data), param.size())
 
 
-indexes = range(sentenceTrain.shape[0])
-random.shuffle(indexes)
-test_indexes = range(sentenceTest.shape[0])
-random.shuffle(test_indexes)
-def generate(data, batch_size, indexes):    
-    data_for_batch = []
-    for i in range(data.shape[0]/batch_size):
-        index_for_batch = indexes[batch_size*i:min(data.shape[0], batch_size*(i+1))]
-        data_for_batch.append(data[index_for_batch])
-    return data_for_batch 
+def useSets(trainSet, testSet=None):
+    """Trains, and tests, on the given sets from now on"""
+    global yTrain, sentenceTrain, positionTrain1, positionTrain2, positionIndexTrain, sdpWeightTrain, indexes
+    global yTest, sentenceTest, positionTest1, positionTest2, positionIndexTest, sdpWeightTest, test_indexes
+    yTrain, sentenceTrain, positionTrain1, positionTrain2, positionIndexTrain, sdpWeightTrain = trainSet
+    indexes = range(sentenceTrain.shape[0])
+    random.shuffle(indexes)
+    if testSet is not None:
+        yTest, sentenceTest, positionTest1, positionTest2, positionIndexTest, sdpWeightTest = testSet
+        test_indexes = range(sentenceTest.shape[0])
+        random.shuffle(test_indexes)
+
+if not pipelined:
+    indexes = range(sentenceTrain.shape[0])
+    random.shuffle(indexes)
+    test_indexes = range(sentenceTest.shape[0])
+    random.shuffle(test_indexes)
+
+def generate(data, batch_size, indexes):
+    return Batches(data, batch_size, indexes)
 
 
 def train(epoch):
@@ -211,6 +233,12 @@ def predict_classes(prediction):
     return prediction.argmax(axis=-1)
 
 for epoch in range(nb_epoch):       
-    train(epoch)
+    if pipelined and epoch == 0:
+        for trainSet in data.chunks():
+            useSets(trainSet)
+            train(epoch)
+        useSets(data['train_set'], data['test_set'])
+    else:
+        train(epoch)
     test()
     print("Max accuracy: %.4f\n" % max_acc)
@@ -0,0 +1,687 @@
+"""
+Memory-mapped columnar format for the preprocessed datasets.
+
+Instead of one gzip pickle, a dataset is a folder with one uncompressed .npy file
+per array, e.g. pkl/sem-relations/train_set.1.npy for the token matrix of the
+training set, a pickle for the small objects like word2Idx and a manifest.json
+listing all of them. loadDataset opens a field only when it is accessed and then
+memory-maps it, so training starts at once and parallel runs share the arrays
+through the page cache.
+
+Sequence fields like the tokens, positions and SDP weights are stored ragged: the
+tokens of all sentences in one flat array plus the offsets of every sentence,
+instead of padding every row to the longest sentence. data['train_set'] returns
+them as PaddedRows, which pad only the rows of a batch to the full width when the
+existing scripts index them, data.ragged() returns the Ragged fields so a batch
+can be padded only to its own longest row.
+
+Every array is stored in the narrowest dtype that holds its values, e.g. uint16
+or int32 token ids, uint8 distance buckets and uint8 for the 0/1 entity
+indicators. The manifest records the dtype the scripts expect, int64 or float32,
+and the fields are widened to it only per batch. The plain arrays are opened as
+the narrow memory maps they are stored as and the PaddedRows of data['train_set']
+pad the tokens of a batch in their stored dtype, widen(batch) casts either.
+data.ragged() fields are widened when a batch of them is padded.
+
+The distance buckets and entity indicators are not stored at all. They follow
+from the entity indices and the sentence lengths, so only those columns are
+saved, once per set, and the Positions and Indicators fields compute the rows
+of a batch from them when it is padded. The SDP weights are stored the same
+way, as the token columns of every shortest dependency path, and the onPath and
+offPath weights can be changed when the dataset is loaded.
+
+The entity-padded and SDP-only variants of a dataset do not need a copy of their
+own either: data.view('entity-padded') and data.view('sdp-only') derive their
+tokens per batch from the ones of the dataset, data.view('reversed') reverses
+every sequence.
+
+A dataset is written into a new folder that replaces the old one once it is
+complete, so a preprocessing run can read the dataset it is about to replace.
+
+Existing pickles are converted with
+
+    python dataset.py pkl/sem-relations.pkl.gz
+"""
+from __future__ import print_function
+import collections
+import gzip
+import json
+import os
+import shutil
+import sys
+if (sys.version_info > (3, 0)):
+    import pickle as pkl
+else: #Python 2.7 imports
+    import cPickle as pkl
+
+import numpy as np
+
+from encode import flatColumns, padRows, relativePositions, entityIndicators, scatterSdpWeights, pathColumns, \
+    entityPaddedColumns, entityPaddedLengths
+
+manifestName = 'manifest.json'
+
+
+def loadDtype(dtype):
+    """Returns the dtype the training scripts expect for a stored dtype, int64 or float32"""
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'iu':
+        return np.dtype('int64')
+    if dtype.kind == 'f':
+        return np.dtype('float32')
+    return dtype
+
+
+def widen(array):
+    """Returns a batch of a stored array in the dtype the scripts expect, as a new array only if it is narrower"""
+    dtype = loadDtype(array.dtype)
+    if array.dtype == dtype:
+        return np.asarray(array)
+    return np.asarray(array).astype(dtype)
+
+
+def compactDtype(array):
+    """Returns the narrowest dtype that holds all values of the array exactly
+
+    Integers get the smallest integer type of their range, floats become float32,
+    float16 stays float16 and floats that are all small whole numbers, like the
+    0/1 indicators, become float16. Floats stay floats, so loadDtype of the stored
+    dtype is always the dtype the scripts expect. The array is read 1M values at a
+    time, so memory-mapped columns are never loaded whole.
+    """
+    if array.size == 0 or array.dtype.kind not in 'iuf':
+        return array.dtype
+    flat = array.reshape(-1)
+    low, high, whole = None, None, True
+    for start in range(0, flat.shape[0], 1 << 20):
+        block = np.asarray(flat[start:start + (1 << 20)])
+        low = block.min() if low is None else min(low, block.min())
+        high = block.max() if high is None else max(high, block.max())
+        whole = whole and array.dtype.kind == 'f' and np.array_equal(block, np.floor(block))
+    if array.dtype.kind == 'f':
+        if low >= -2048 and high <= 2048 and whole:
+            return np.dtype('float16')
+        return np.dtype('float16') if array.dtype == np.float16 else np.dtype('float32')
+    return np.result_type(np.min_scalar_type(int(low)), np.min_scalar_type(int(high)))
+
+
+def saveCompact(path, array):
+    """Saves the array to the .npy file in its compactDtype, 1M values at a time"""
+    array = array if isinstance(array, np.ndarray) else np.asarray(array)
+    dtype = compactDtype(array)
+    if array.size == 0 or array.dtype.kind not in 'iuf':
+        np.save(path, array.astype(dtype))
+        return
+    out = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=array.shape)
+    flat, outFlat = array.reshape(-1), out.reshape(-1)
+    for start in range(0, flat.shape[0], 1 << 20):
+        outFlat[start:start + (1 << 20)] = flat[start:start + (1 << 20)]
+    out.flush()
+    del out
+
+
+def allRows(field, index):
+    """Returns index as an array, all rows of the field if it is None"""
+    if index is None:
+        return np.arange(field.shape[0])
+    return np.asarray(index)
+
+
+def offsetsOf(lengths):
+    """Returns the offsets of rows with the given lengths in their flat values"""
+    return np.concatenate(([0], np.cumsum(lengths))).astype('int64')
+
+
+class Ragged(collections.namedtuple('Ragged', ['values', 'offsets', 'width', 'dtype'])):
+    """Rows of different lengths, row i is values[offsets[i]:offsets[i+1]] padded with zeros to width
+
+    The values may be stored narrower than dtype, the rows are returned as dtype.
+    """
+
+    def __new__(cls, values, offsets, width, dtype=None):
+        return super(Ragged, cls).__new__(cls, values, offsets, width, values.dtype if dtype is None else np.dtype(dtype))
+
+    @property
+    def shape(self):
+        return (len(self.offsets)-1, self.width)
+
+    def lengths(self):
+        return np.diff(np.asarray(self.offsets, dtype='int64'))
+
+    def max(self):
+        """Returns the largest value of all rows"""
+        return np.max(self.values) if len(self.values) > 0 else 0
+
+    def rows(self, index=None, width=None):
+        """Returns the selected rows zero padded to width, by default to their own longest row"""
+        index = allRows(self, index)
+        starts = np.asarray(self.offsets[:-1], dtype='int64')[index]
+        lengths = self.lengths()[index]
+        if width is None:
+            width = int(np.max(lengths)) if len(lengths) > 0 else 0
+        flat = np.repeat(starts, lengths) + flatColumns(lengths)
+        return padRows(np.asarray(self.values)[flat], lengths, width, self.dtype)
+
+
+class Positions(collections.namedtuple('Positions', ['pos', 'lengths', 'width', 'minDistance', 'maxDistance'])):
+    """Distance buckets of every token to the entity at pos, computed from pos and the sentence lengths"""
+
+    @property
+    def shape(self):
+        return (len(self.pos), self.width)
+
+    def max(self):
+        """Returns the largest bucket of all rows, computed in chunks of rows"""
+        chunks = [self.rows(np.arange(start, min(start+4096, len(self.pos))), self.width) for start in range(0, len(self.pos), 4096)]
+        return max([int(np.max(chunk)) for chunk in chunks if chunk.size > 0] + [0])
+
+    def rows(self, index=None, width=None):
+        """Returns the buckets of the selected rows zero padded to width, by default to their own longest row"""
+        index = allRows(self, index)
+        lengths = np.asarray(self.lengths, dtype='int64')[index]
+        if width is None:
+            width = int(np.max(lengths)) if len(lengths) > 0 else 0
+        pos = np.asarray(self.pos, dtype='int64')[index]
+        return relativePositions(pos, lengths, width, self.minDistance, self.maxDistance).astype('int64')
+
+
+class Indicators(collections.namedtuple('Indicators', ['positions', 'shifts', 'width'])):
+    """Concatenated one-hot blocks of width columns, block i marks positions[i] + shifts[i]"""
+
+    @property
+    def shape(self):
+        return (len(self.positions[0]), len(self.positions)*self.width)
+
+    def rows(self, index=None, width=None):
+        """Returns the indicators of the selected rows, the blocks always span the full width"""
+        index = allRows(self, index)
+        positions = [np.asarray(pos, dtype='int64')[index] + shift for pos, shift in zip(self.positions, self.shifts)]
+        return entityIndicators(positions, self.width)
+
+
+class SdpWeights(collections.namedtuple('SdpWeights', ['columns', 'offsets', 'pos1', 'pos2', 'lengths', 'width', 'onPath', 'offPath'])):
+    """Weights of the tokens on the shortest dependency path, scattered from the path columns[offsets[i]:offsets[i+1]]"""
+
+    @property
+    def shape(self):
+        return (len(self.pos1), self.width)
+
+    def rows(self, index=None, width=None):
+        """Returns the weights of the selected rows zero padded to width, by default to their own longest row"""
+        index = allRows(self, index)
+        offsets = np.asarray(self.offsets, dtype='int64')
+        starts = offsets[:-1][index]
+        pathLengths = np.diff(offsets)[index]
+        columns = np.asarray(self.columns, dtype='int64')[np.repeat(starts, pathLengths) + flatColumns(pathLengths)]
+        lengths = np.asarray(self.lengths, dtype='int64')[index]
+        pos1 = np.asarray(self.pos1, dtype='int64')[index]
+        pos2 = np.asarray(self.pos2, dtype='int64')[index]
+        if width is None:
+            #Path tokens spaCy split off and the entities can lie past the sentence length
+            width = int(np.max(np.concatenate((lengths, columns+1, pos1+1, pos2+1, [0]))))
+        return scatterSdpWeights(columns, pathLengths, pos1, pos2, lengths, width, self.onPath, self.offPath)
+
+
+def toSdpWeights(paths, pos1, pos2, lengths, width, onPath=0.8, offPath=0.3):
+    """Returns the sdpWeights of the paths as SdpWeights, only the path columns are stored"""
+    columns, pathLengths = pathColumns(paths)
+    return pathWeights(columns, pathLengths, pos1, pos2, lengths, width, onPath, offPath)
+
+
+def pathWeights(columns, pathLengths, pos1, pos2, lengths, width, onPath=0.8, offPath=0.3):
+    """Returns the SdpWeights of the paths given by their flat columns and lengths"""
+    return SdpWeights(columns, offsetsOf(pathLengths), pos1, pos2, lengths, width, onPath, offPath)
+
+
+class EntityPadded(collections.namedtuple('EntityPadded', ['tokens', 'pos1', 'pos2'])):
+    """Ragged tokens with a PADDING_TOKEN inserted on both sides of every entity"""
+
+    @property
+    def width(self):
+        return self.tokens.width+4
+
+    @property
+    def shape(self):
+        return (self.tokens.shape[0], self.width)
+
+    def lengths(self):
+        return entityPaddedLengths(np.asarray(self.pos1, dtype='int64'), np.asarray(self.pos2, dtype='int64'), self.tokens.lengths())
+
+    def rows(self, index=None, width=None):
+        """Returns the selected rows zero padded to width, by default to their own longest row"""
+        index = allRows(self, index)
+        starts = np.asarray(self.tokens.offsets[:-1], dtype='int64')[index]
+        lengths = self.tokens.lengths()[index]
+        pos1 = np.asarray(self.pos1, dtype='int64')[index]
+        pos2 = np.asarray(self.pos2, dtype='int64')[index]
+        if width is None:
+            paddedLengths = entityPaddedLengths(pos1, pos2, lengths)
+            width = int(np.max(paddedLengths)) if len(paddedLengths) > 0 else 0
+        #The PADDING_TOKEN has index 0, so only the tokens are moved and the gaps stay zero
+        columns = entityPaddedColumns(pos1, pos2, lengths)[0]
+        values = np.asarray(self.tokens.values)[np.repeat(starts, lengths) + flatColumns(lengths)]
+        return padRows(values, lengths, width, self.tokens.dtype, columns)
+
+
+class PathTokens(collections.namedtuple('PathTokens', ['tokens', 'sdp', 'width'])):
+    """The tokens on the shortest dependency path of every sentence, gathered from the Ragged tokens"""
+
+    @property
+    def shape(self):
+        return (self.tokens.shape[0], self.width)
+
+    def lengths(self):
+        return np.diff(np.asarray(self.sdp.offsets, dtype='int64'))
+
+    def rows(self, index=None, width=None):
+        """Returns the path tokens of the selected rows zero padded to width, by default to their own longest path"""
+        index = allRows(self, index)
+        offsets = np.asarray(self.sdp.offsets, dtype='int64')
+        pathLengths = self.lengths()[index]
+        columns = np.asarray(self.sdp.columns, dtype='int64')[np.repeat(offsets[:-1][index], pathLengths) + flatColumns(pathLengths)]
+        starts = np.repeat(np.asarray(self.tokens.offsets[:-1], dtype='int64')[index], pathLengths)
+        #Path tokens spaCy split off have no token of their own, they become PADDING_TOKENs
+        inside = columns < np.repeat(self.tokens.lengths()[index], pathLengths)
+        values = np.zeros(len(columns), dtype=self.tokens.values.dtype)
+        values[inside] = np.asarray(self.tokens.values)[starts[inside] + columns[inside]]
+        if width is None:
+            width = int(np.max(pathLengths)) if len(pathLengths) > 0 else 0
+        return padRows(values, pathLengths, width, self.tokens.dtype)
+
+
+class Reversed(collections.namedtuple('Reversed', ['field', 'lengths', 'blockWidth'])):
+    """The rows of field with the first lengths[i] values of every block in reverse order"""
+
+    @property
+    def shape(self):
+        return self.field.shape
+
+    @property
+    def width(self):
+        return self.field.width
+
+    def rows(self, index=None, width=None):
+        """Returns the reversed rows of field, padded like field.rows"""
+        index = allRows(self, index)
+        matrix = self.field.rows(index, width)
+        blockWidth = matrix.shape[1] if self.blockWidth is None else self.blockWidth
+        lengths = np.asarray(self.lengths, dtype='int64')[index].reshape(-1, 1)
+        columns = np.arange(matrix.shape[1])
+        blockStart = columns - columns % blockWidth
+        column = columns % blockWidth
+        source = np.where(column < lengths, blockStart + lengths-1 - column, columns)
+        return matrix[np.arange(matrix.shape[0]).reshape(-1, 1), source]
+
+
+#Fields that are padded to the rows of a batch when it is read
+rowFields = (Ragged, Positions, Indicators, SdpWeights, EntityPadded, PathTokens, Reversed)
+
+
+def storedField(field):
+    """Returns the row field with the rows of its Ragged tokens padded in their stored dtype"""
+    if isinstance(field, Ragged):
+        return field._replace(dtype=field.values.dtype)
+    if isinstance(field, (EntityPadded, PathTokens)):
+        return field._replace(tokens=storedField(field.tokens))
+    if isinstance(field, Reversed):
+        return field._replace(field=storedField(field.field))
+    return field
+
+
+class PaddedRows(object):
+    """Row-indexable row field, only the rows it is indexed with are padded to the full width of the field
+
+    Indexing with an index, a slice or an array of row indices returns the padded
+    rows, np.asarray pads all rows. max() pads the rows in chunks. Stored tokens
+    keep their narrow dtype, widen() casts a batch of them.
+    """
+
+    def __init__(self, field):
+        self.field = storedField(field)
+
+    @property
+    def shape(self):
+        return self.field.shape
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def dtype(self):
+        return self.field.rows(np.zeros(0, dtype='int64'), self.field.width).dtype
+
+    def __len__(self):
+        return self.field.shape[0]
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            return self[index[0]][(slice(None),) + index[1:]]
+        if isinstance(index, slice):
+            return self.field.rows(np.arange(len(self))[index], self.field.width)
+        if np.isscalar(index):
+            return self.field.rows([index], self.field.width)[0]
+        return self.field.rows(index, self.field.width)
+
+    def __iter__(self):
+        for start in range(0, len(self), 4096):
+            for row in self[start:start+4096]:
+                yield row
+
+    def __array__(self, dtype=None, copy=None):
+        rows = self.field.rows(width=self.field.width)
+        return rows if dtype is None else rows.astype(dtype)
+
+    def max(self, axis=None, out=None, **kwargs):
+        """Returns the largest value of all rows, np.max calls it"""
+        if axis is not None:
+            return np.asarray(self).max(axis=axis)
+        chunks = [self[start:start+4096] for start in range(0, len(self), 4096)]
+        return max([np.max(chunk) for chunk in chunks if chunk.size > 0] + [0])
+
+
+def lazyFields(value):
+    """Returns the row fields of value, a field or a tuple of fields, as PaddedRows"""
+    if isinstance(value, rowFields):
+        return PaddedRows(value)
+    if isinstance(value, tuple):
+        return tuple(PaddedRows(field) if isinstance(field, rowFields) else field for field in value)
+    return value
+
+
+class Batches(object):
+    """The batches of batchSize rows of a field in the order of indexes, a batch is read when it is indexed
+
+    Plain arrays are widened and PaddedRows padded to the full width, other row
+    fields only to the longest row of the batch. A value assigned to a batch, like
+    the Variable of it, is returned for that batch until the next one is assigned,
+    so a training loop over the batches holds one batch of the field at a time.
+    There are count batches, by default only full ones.
+    """
+
+    def __init__(self, field, batchSize, indexes, count=None):
+        self.field = field
+        self.batchSize = batchSize
+        self.indexes = indexes
+        self.count = field.shape[0] // batchSize if count is None else count
+        self.assigned = {}
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i in self.assigned:
+            return self.assigned[i]
+        if i < 0 or i >= len(self):
+            raise IndexError(i)
+        index = self.indexes[self.batchSize*i:self.batchSize*(i+1)]
+        if isinstance(self.field, rowFields):
+            return self.field.rows(index)
+        return widen(self.field[index])
+
+    def __setitem__(self, i, value):
+        self.assigned = {i: value}
+
+
+def padFields(value):
+    """Pads the row fields of value, a field or a tuple of fields, to their full width"""
+    if isinstance(value, rowFields):
+        return value.rows(width=value.width)
+    if isinstance(value, tuple):
+        return tuple(field.rows(width=field.width) if isinstance(field, rowFields) else field for field in value)
+    return value
+
+
+def raggedRows(values, lengths, width):
+    """Returns the flat values of rows with the given lengths as Ragged"""
+    return Ragged(values, offsetsOf(lengths), width)
+
+
+def toRagged(matrix, lengths):
+    """Returns the first lengths[i] values of every row of the padded matrix as Ragged
+
+    Rows with non-zero values past lengths[i], e.g. SDP weights of tokens spaCy split
+    off, are kept up to their last non-zero value so nothing is lost.
+    """
+    nonzero = matrix != 0
+    lastNonzero = np.where(nonzero.any(axis=1), matrix.shape[1] - np.argmax(nonzero[:, ::-1], axis=1), 0)
+    lengths = np.maximum(np.asarray(lengths, dtype='int64'), lastNonzero)
+    values = matrix[np.arange(matrix.shape[1]) < lengths.reshape(-1, 1)]
+    return Ragged(values, offsetsOf(lengths), matrix.shape[1], matrix.dtype)
+
+
+def datasetFolder(path):
+    """Returns the folder of the columnar dataset for a path with or without .pkl.gz"""
+    if path.endswith('.pkl.gz'):
+        path = path[:-len('.pkl.gz')]
+    return path.rstrip('/')
+
+
+def hasDataset(path):
+    """Returns whether a complete columnar dataset is stored at path"""
+    return os.path.isfile(os.path.join(datasetFolder(path), manifestName))
+
+
+def saveDataset(path, data):
+    """Stores the arrays, tuples of arrays and other objects of data as a columnar dataset, each array in its narrowest dtype
+
+    The dataset is written into a new folder that replaces the old one at the end, so
+    data may hold fields opened from the dataset at path and a failed run leaves the
+    old dataset as it was.
+    """
+    target = datasetFolder(path)
+    folder = target + '.tmp'
+    if os.path.isdir(folder):
+        shutil.rmtree(folder)
+    os.makedirs(folder)
+
+    #Columns shared by several fields, like the entity indices, are only saved once
+    files = {}
+    def saveColumn(name, array):
+        if id(array) not in files:
+            files[id(array)] = name + '.npy'
+            saveCompact(os.path.join(folder, name + '.npy'), array)
+        return files[id(array)]
+
+    def saveArray(name, array):
+        if isinstance(array, Ragged):
+            return {'values': saveColumn(name + '.values', array.values), 'offsets': saveColumn(name + '.offsets', array.offsets),
+                    'width': int(array.width), 'dtype': loadDtype(array.dtype).name}
+        if isinstance(array, Positions):
+            return {'positions': saveColumn(name + '.positions', array.pos), 'lengths': saveColumn(name + '.lengths', array.lengths),
+                    'width': int(array.width), 'minDistance': int(array.minDistance), 'maxDistance': int(array.maxDistance)}
+        if isinstance(array, SdpWeights):
+            return {'paths': saveColumn(name + '.paths', array.columns), 'pathOffsets': saveColumn(name + '.pathOffsets', array.offsets),
+                    'pos1': saveColumn(name + '.pos1', array.pos1), 'pos2': saveColumn(name + '.pos2', array.pos2),
+                    'lengths': saveColumn(name + '.lengths', array.lengths), 'width': int(array.width),
+                    'onPath': float(array.onPath), 'offPath': float(array.offPath)}
+        if isinstance(array, Indicators):
+            return {'indicators': [saveColumn('%s.positions%d' % (name, block), pos) for block, pos in enumerate(array.positions)],
+                    'shifts': [int(shift) for shift in array.shifts], 'width': int(array.width)}
+        return {'values': saveColumn(name, array), 'dtype': loadDtype(np.asarray(array).dtype).str}
+
+    manifest = {'arrays': {}, 'tuples': {}, 'objects': {}}
+    for key, value in data.items():
+        if isinstance(value, np.ndarray) or isinstance(value, rowFields):
+            manifest['arrays'][key] = saveArray(key, value)
+        elif isinstance(value, tuple):
+            manifest['tuples'][key] = [saveArray('%s.%d' % (key, idx), array) for idx, array in enumerate(value)]
+        else:
+            manifest['objects'][key] = key + '.pkl'
+            f = open(os.path.join(folder, key + '.pkl'), 'wb')
+            pkl.dump(value, f, pkl.HIGHEST_PROTOCOL)
+            f.close()
+
+    #The manifest is written last, a folder without one is incomplete
+    f = open(os.path.join(folder, manifestName), 'w')
+    json.dump(manifest, f, indent=1, sort_keys=True)
+    f.close()
+
+    #Open memory maps of the old dataset stay valid when its folder is removed
+    shutil.rmtree(target + '.old', ignore_errors=True)
+    if os.path.isdir(target):
+        os.rename(target, target + '.old')
+    os.rename(folder, target)
+    shutil.rmtree(target + '.old', ignore_errors=True)
+
+
+class LazyDataset(object):
+    """Read-only mapping over a columnar dataset, every field is opened on first access
+
+    Ragged, Positions, Indicators and SdpWeights fields are returned as PaddedRows,
+    ragged() returns them as they are stored. All other arrays are opened in
+    their stored dtype, widen() casts a batch of them. onPath and offPath replace the SDP
+    weights the dataset was preprocessed with.
+    """
+
+    def __init__(self, folder, onPath=None, offPath=None):
+        self.folder = folder
+        self.onPath = onPath
+        self.offPath = offPath
+        f = open(os.path.join(folder, manifestName))
+        self.manifest = json.load(f)
+        f.close()
+        self.fields = {}
+
+    def keys(self):
+        return [key for group in self.manifest.values() for key in group]
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def __getitem__(self, key):
+        return lazyFields(self.ragged(key))
+
+    def ragged(self, key):
+        if key not in self.fields:
+            self.fields[key] = self.open(key)
+        return self.fields[key]
+
+    def view(self, name):
+        """Returns the view name of this dataset, see DatasetView"""
+        return DatasetView(self, name)
+
+    def open(self, key):
+        if key in self.manifest['arrays']:
+            return self.openArray(self.manifest['arrays'][key])
+        if key in self.manifest['tuples']:
+            return tuple(self.openArray(entry) for entry in self.manifest['tuples'][key])
+        if key in self.manifest['objects']:
+            f = open(os.path.join(self.folder, self.manifest['objects'][key]), 'rb')
+            value = pkl.load(f)
+            f.close()
+            return value
+        raise KeyError(key)
+
+    def openArray(self, entry):
+        if not isinstance(entry, dict):
+            return np.load(os.path.join(self.folder, entry), mmap_mode='r')
+        if 'positions' in entry:
+            return Positions(self.openArray(entry['positions']), self.openArray(entry['lengths']), entry['width'],
+                             entry['minDistance'], entry['maxDistance'])
+        if 'paths' in entry:
+            return SdpWeights(self.openArray(entry['paths']), self.openArray(entry['pathOffsets']),
+                              self.openArray(entry['pos1']), self.openArray(entry['pos2']), self.openArray(entry['lengths']),
+                              entry['width'], entry['onPath'] if self.onPath is None else self.onPath,
+                              entry['offPath'] if self.offPath is None else self.offPath)
+        if 'indicators' in entry:
+            return Indicators([self.openArray(name) for name in entry['indicators']], entry['shifts'], entry['width'])
+        values = self.openArray(entry['values'])
+        if 'offsets' in entry:
+            return Ragged(values, self.openArray(entry['offsets']), entry['width'], entry.get('dtype'))
+        #Whole-number floats stored as uint8 by earlier datasets are still widened when opened
+        if 'dtype' in entry and loadDtype(values.dtype) != np.dtype(entry['dtype']):
+            return values.astype(entry['dtype'])
+        return values
+
+
+class DatasetView(object):
+    """Read-only mapping over a dataset that derives the sets of another preprocessing variant per batch
+
+    The sets are the tuples named like train_set, (labels, tokens, positions1, positions2,
+    positionIndex, sdpWeights) as written by preprocess.py and preprocess_low_dim.py,
+    the views are
+
+        'entity-padded'  the tokens with a PADDING_TOKEN around both entities, of the *_pi.py scripts
+        'sdp-only'       only the tokens on the shortest dependency path, of the rnn sdp scripts
+        'reversed'       every sequence in reverse order
+
+    All other fields, like wordEmbeddings or the train_lines kept for the next
+    preprocessing run, are the ones of the dataset.
+    """
+    names = ['entity-padded', 'sdp-only', 'reversed']
+
+    def __init__(self, data, name):
+        if name not in self.names:
+            raise ValueError("Unknown view %s, use one of %s" % (name, ", ".join(self.names)))
+        self.data = data
+        self.name = name
+        self.fields = {}
+
+    def keys(self):
+        return self.data.keys()
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __getitem__(self, key):
+        return lazyFields(self.ragged(key))
+
+    def sets(self):
+        """Returns the keys of the sets of the dataset"""
+        return [key for key in self.data.manifest['tuples'] if key.endswith('_set')]
+
+    def ragged(self, key):
+        if key not in self.sets():
+            return self.data.ragged(key)
+        if key not in self.fields:
+            self.fields[key] = self.open(self.data.ragged(key))
+        return self.fields[key]
+
+    def pathWidth(self):
+        """Returns the longest shortest dependency path of all sets"""
+        pathLengths = [self.data.ragged(key)[5].offsets for key in self.sets()]
+        return max([int(np.max(np.diff(np.asarray(offsets, dtype='int64')))) for offsets in pathLengths if len(offsets) > 1] + [0])
+
+    def open(self, fields):
+        labels, tokens, positions1, positions2, positionIndex, sdp = fields
+        if not (isinstance(tokens, Ragged) and isinstance(positions1, Positions) and isinstance(positionIndex, Indicators) and isinstance(sdp, SdpWeights)):
+            raise ValueError("The %s view needs a dataset written by preprocess.py or preprocess_low_dim.py" % self.name)
+
+        if self.name == 'entity-padded':
+            return labels, EntityPadded(tokens, sdp.pos1, sdp.pos2), positions1, positions2, positionIndex, sdp
+
+        if self.name == 'sdp-only':
+            width = self.pathWidth()
+            pathLengths = np.diff(np.asarray(sdp.offsets, dtype='int64'))
+            empty = np.array([], dtype='float32')
+            return labels, PathTokens(tokens, sdp, width), \
+                Positions(sdp.pos1, pathLengths, width, positions1.minDistance, positions1.maxDistance), \
+                Positions(sdp.pos2, pathLengths, width, positions2.minDistance, positions2.maxDistance), empty, empty
+
+        lengths = sdp.lengths
+        return labels, Reversed(tokens, tokens.lengths(), None), Reversed(positions1, lengths, None), \
+            Reversed(positions2, lengths, None), Reversed(positionIndex, lengths, positionIndex.width), Reversed(sdp, lengths, None)
+
+
+def loadDataset(path, onPath=None, offPath=None):
+    """Opens the columnar dataset at path, falls back to the gzip pickle path.pkl.gz if there is none
+
+    onPath and offPath override the weights of the SDP fields without preprocessing again.
+    """
+    folder = datasetFolder(path)
+    if os.path.isfile(os.path.join(folder, manifestName)):
+        return LazyDataset(folder, onPath, offPath)
+
+    f = gzip.open(folder + '.pkl.gz', 'rb')
+    data = pkl.load(f)
+    f.close()
+    return data
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        f = gzip.open(path, 'rb')
+        saveDataset(path, pkl.load(f))
+        f.close()
+        print("Converted", path, "to", datasetFolder(path))
@@ -0,0 +1,247 @@
+"""
+Batch encoders for the matrices of the preprocessing scripts.
+
+Instead of looping over the tokens of every sentence, the features of a whole file
+are computed with array arithmetic and written straight into preallocated
+matrices. Every distinct token is only looked up once in word2Idx, through a
+Vocabulary that keeps the resolved lowercase and unknown fallbacks.
+
+The outputs hold the same values as the per token loops they replace, in the
+narrowest dtype that fits them: int32 token ids and uint8 distance buckets.
+"""
+from __future__ import print_function
+import hashlib
+import numpy as np
+
+#The columns readFile of the preprocess scripts keeps for every line, tokens and
+#paths are flat with lengths and pathLengths entries per line, pathSources says how
+#the path of a line was found
+lineColumns = ['hashes', 'labels', 'pos1', 'pos2', 'tokens', 'lengths', 'paths', 'pathLengths', 'pathSources']
+
+
+def getWordIdx(token, word2Idx):
+    """Returns from the word2Idex table the word index for a given token"""
+    if token in word2Idx:
+        return word2Idx[token]
+    elif token.lower() in word2Idx:
+        return word2Idx[token.lower()]
+
+    return word2Idx["UNKNOWN_TOKEN"]
+
+
+class Vocabulary(object):
+    """word2Idx with the getWordIdx fallbacks resolved once per surface form
+
+    All words of word2Idx are known from the start. Any other token is resolved
+    through its lowercase form or UNKNOWN_TOKEN the first time it is seen and then
+    kept, so every later lookup of it is a single dict probe.
+    """
+
+    def __init__(self, word2Idx):
+        self.word2Idx = word2Idx
+        self.unknown = word2Idx["UNKNOWN_TOKEN"]
+        self.ids = dict(word2Idx)
+
+    def __len__(self):
+        return len(self.word2Idx)
+
+    def __getitem__(self, token):
+        idx = self.ids.get(token)
+        if idx is None:
+            idx = self.ids[token] = self.word2Idx.get(token.lower(), self.unknown)
+        return idx
+
+    def lookup(self, tokens):
+        """Returns the word indices of a list of tokens"""
+        return np.array([self[token] for token in tokens], dtype='int32')
+
+    def encode(self, tokenLists):
+        """Returns the word indices of all tokens as one flat array and the number of tokens per sentence"""
+        ids = self.lookup([token for tokens in tokenLists for token in tokens])
+        lengths = np.array([len(tokens) for tokens in tokenLists], dtype='int64')
+        return ids, lengths
+
+
+def lookupTokens(tokenLists, word2Idx):
+    """Returns the word indices of all tokens as one flat array and the number of tokens per sentence"""
+    return Vocabulary(word2Idx).encode(tokenLists)
+
+
+def lineChunks(path, chunkLines):
+    """Yields the tab separated lines of the file in lists of at most chunkLines lines"""
+    chunk = []
+    for line in open(path):
+        chunk.append(line.strip().split('\t'))
+        if len(chunk) == chunkLines:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def lineHashes(lines):
+    """Returns the sha1 of every tab separated line"""
+    return np.array([hashlib.sha1('\t'.join(splits).encode('utf-8')).hexdigest() for splits in lines], dtype='S40')
+
+
+def knownLines(hashes):
+    """Returns the row of every line hash"""
+    return dict((lineHash, row) for row, lineHash in enumerate(hashes))
+
+
+def emptyColumns():
+    """Returns the lineColumns of no lines"""
+    columns = dict((key, np.zeros(0, dtype='int64')) for key in lineColumns)
+    columns['hashes'] = np.zeros(0, dtype='S40')
+    columns['tokens'] = np.zeros(0, dtype='int32')
+    return columns
+
+
+def lineStarts(columns):
+    """Returns the start of every line in the flat tokens and paths of the columns"""
+    return dict((valuesKey, np.cumsum(columns[lengthsKey], dtype='int64') - columns[lengthsKey])
+                for valuesKey, lengthsKey in [('tokens', 'lengths'), ('paths', 'pathLengths')])
+
+
+def gatherRows(previous, current, source):
+    """Returns row source[i] of previous, or row -source[i]-1 of current where it is negative"""
+    old = source >= 0
+    rows = np.empty(len(source), dtype=np.result_type(previous.dtype, current.dtype))
+    rows[old] = previous[source[old]]
+    rows[~old] = current[-source[~old] - 1]
+    return rows
+
+
+def mergeColumns(previous, current, source, starts=None, tokenIds=None):
+    """Returns the columns of the lines of source, line i is row source[i] of previous or row -source[i]-1 of current
+
+    Only the rows of these lines are read, so a file can be merged block by block.
+    starts are the lineStarts of previous and current, tokenIds maps the tokens of
+    current to word ids.
+    """
+    source = np.asarray(source, dtype='int64')
+    if starts is None:
+        starts = [lineStarts(previous), lineStarts(current)]
+    merged = {}
+    for key in ['hashes', 'labels', 'pos1', 'pos2', 'pathSources']:
+        merged[key] = gatherRows(previous[key], current[key], source)
+    for valuesKey, lengthsKey in [('tokens', 'lengths'), ('paths', 'pathLengths')]:
+        lengths = gatherRows(previous[lengthsKey], current[lengthsKey], source).astype('int64')
+        merged[lengthsKey] = lengths
+        flat = np.repeat(gatherRows(starts[0][valuesKey], starts[1][valuesKey], source), lengths) + flatColumns(lengths)
+        old = np.repeat(source >= 0, lengths)
+        currentValues = current[valuesKey][flat[~old]]
+        if valuesKey == 'tokens' and tokenIds is not None:
+            currentValues = tokenIds[currentValues]
+        values = np.empty(len(flat), dtype=np.result_type(previous[valuesKey].dtype, currentValues.dtype))
+        values[old] = previous[valuesKey][flat[old]]
+        values[~old] = currentValues
+        merged[valuesKey] = values
+    return merged
+
+
+class TokenTable(object):
+    """Numbers the distinct tokens of a corpus while it is read, before word2Idx is known
+
+    Once the embeddings are loaded, mapping() turns the numbers into word indices,
+    so the tokens of the whole corpus are looked up with one gather.
+    """
+
+    def __init__(self):
+        self.numbers = {}
+
+    def encode(self, tokenLists):
+        """Returns the numbers of all tokens as one flat array and the number of tokens per sentence"""
+        numbers = []
+        for tokens in tokenLists:
+            for token in tokens:
+                numbers.append(self.numbers.setdefault(token, len(self.numbers)))
+        lengths = np.array([len(tokens) for tokens in tokenLists], dtype='int64')
+        return np.array(numbers, dtype='int32'), lengths
+
+    def mapping(self, word2Idx):
+        """Returns the word index of every token number"""
+        return Vocabulary(word2Idx).lookup(sorted(self.numbers, key=self.numbers.get))
+
+
+def flatColumns(lengths):
+    """Returns for the flat values of all sentences the column of each of them"""
+    offsets = np.cumsum(lengths) - lengths
+    return np.arange(np.sum(lengths)) - np.repeat(offsets, lengths)
+
+
+def padRows(values, lengths, width, dtype=None, columns=None):
+    """Scatters the flat values of every sentence into a zero padded matrix, by default from column 0 on"""
+    matrix = np.zeros((len(lengths), width), dtype=values.dtype if dtype is None else dtype)
+    if columns is None:
+        columns = flatColumns(lengths)
+    matrix[np.repeat(np.arange(len(lengths)), lengths), columns] = values
+    return matrix
+
+
+def relativePositions(pos, lengths, width, minDistance, maxDistance):
+    """Returns the distanceMapping bucket of every token to the entity at pos, 0 after the last token
+
+    Distances below minDistance map to 'LowerMin' (1), above maxDistance to
+    'GreaterMax' (2) and minDistance..maxDistance to 3, 4, ...
+    """
+    columns = np.arange(width)
+    distance = columns - np.reshape(pos, (-1, 1))
+    buckets = np.where(distance < minDistance, 1, np.where(distance > maxDistance, 2, distance - minDistance + 3))
+    buckets[columns >= np.reshape(lengths, (-1, 1))] = 0
+    return buckets.astype(np.min_scalar_type(maxDistance - minDistance + 3))
+
+
+def entityIndicators(positions, width):
+    """Returns the concatenated one-hot blocks of the given position arrays"""
+    rows = np.arange(len(positions[0]))
+    columns = np.arange(width)
+    indicators = np.zeros((len(rows), len(positions)*width), dtype='float32')
+    for block, pos in enumerate(positions):
+        #Same wrap around for -1 and IndexError past the end as indexing the block directly
+        indicators[rows, block*width + columns[pos]] = 1
+    return indicators
+
+
+def pathColumns(paths):
+    """Returns the token columns of all shortest dependency paths as one flat array and the length of every path"""
+    pathLengths = np.array([len(path) for path in paths], dtype='int64')
+    columns = np.array([column for path in paths for column in path], dtype='int64')
+    return columns, pathLengths
+
+
+def scatterSdpWeights(columns, pathLengths, pos1, pos2, lengths, width, onPath=0.8, offPath=0.3):
+    """Returns the sdpWeights of the paths given by their flat columns and lengths"""
+    rows = np.arange(len(pathLengths))
+    weights = np.zeros((len(pathLengths), width), dtype=np.float32)
+    weights[np.arange(width) < np.reshape(lengths, (-1, 1))] = offPath
+    weights[np.repeat(rows, pathLengths), columns] = onPath
+    weights[rows, pos1] = offPath
+    weights[rows, pos2] = offPath
+    return weights
+
+
+def sdpWeights(paths, pos1, pos2, lengths, width, onPath=0.8, offPath=0.3):
+    """Returns the weight of every token, onPath on the shortest dependency path except the entities, offPath elsewhere"""
+    columns, pathLengths = pathColumns(paths)
+    return scatterSdpWeights(columns, pathLengths, pos1, pos2, lengths, width, onPath, offPath)
+
+
+def entityPaddedColumns(pos1, pos2, lengths):
+    """Returns the columns of the tokens and of the PADDING_TOKENs when every entity gets a PADDING_TOKEN on both sides"""
+    pos1 = np.repeat(pos1, lengths)
+    pos2 = np.repeat(pos2, lengths)
+    index = flatColumns(lengths)
+    isEntity = (index == pos1) | (index == pos2)
+    before = (index > pos1).astype('int64') + ((index > pos2) & (pos2 != pos1))
+    columns = index + 2*before + isEntity
+
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    paddingRows = np.concatenate((rows[isEntity], rows[isEntity]))
+    paddingColumns = np.concatenate((columns[isEntity]-1, columns[isEntity]+1))
+    return columns, paddingRows, paddingColumns
+
+
+def entityPaddedLengths(pos1, pos2, lengths):
+    """Returns the sentence lengths with the PADDING_TOKENs around the entities"""
+    return lengths + 2*((pos1 < lengths).astype('int64') + ((pos2 < lengths) & (pos2 != pos1)))
@@ -0,0 +1,287 @@
+"""
+Batched dependency parsing for the preprocessing scripts.
+
+The sentences are streamed through nlp.pipe in batches. With nProcess > 1 the
+batches are spread over a pool of worker processes, each of them loading its own
+copy of the spaCy model. Pool.imap hands the batches back in input order, so the
+result is the same as parsing the sentences one by one.
+
+For every sentence only the head index of each token is kept, that is all the
+shortest dependency path needs and it is cheap to send between processes.
+
+Only the components the parser needs, parserPipes, are run. The lines of the
+corpus are already tokenized, so whitespace_tokenizer makes one token per word of
+sentenceTokens, the same split the preprocessing uses, and the token indices stay
+aligned with pos1 and pos2.
+
+The heads are also kept in an on-disk parse cache, one gzip file per parser
+version and set of pipes that maps the sha1 of a sentence to its heads. All preprocessing
+variants share it, after the first run they do not need spaCy at all. The file
+is append-only, saveCaches() adds the new parses as one more pickled gzip member
+instead of writing the whole cache again. The member is compressed first and then
+appended while holding an flock on the .lock file next to the cache, the cache is
+also read under it, so processes sharing the cache never see half a member. A
+cache cut short by a crash keeps the parses before the cut and is written again. In memory the heads of every sentence
+are kept as the bytes of an int32 array, about half the size of a list of ints.
+
+custom_tokenizer is the tokenizer the rnn variants used before, it splits brackets
+and quotes off the tokens and tokens at a ~.
+
+A file that is parsed chunk by chunk reuses the same pool of worker processes
+for all chunks and appends the new parses with saveCaches() after every chunk.
+"""
+from __future__ import print_function
+import atexit
+import gzip
+import fcntl
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import sys
+import time
+import zlib
+if (sys.version_info > (3, 0)):
+    import pickle as pkl
+    unicode = str
+else: #Python 2.7 imports
+    import cPickle as pkl
+
+import numpy as np
+import spacy
+from spacy.tokens import Doc
+from spacy.tokenizer import Tokenizer
+
+nlp = None
+#The (model, tokenizer, pipes) nlp was loaded with
+loadedParser = None
+caches = {}
+#The parses of every cache that are not appended to its file yet
+newParses = {}
+pools = {}
+
+#The components of the pipeline the dependency heads need, all others are disabled
+parserPipes = ['parser']
+
+prefix_re = re.compile(r'''^[\[\("]''')
+suffix_re = re.compile(r'''[\]\)"]$''')
+infix_re = re.compile(r'''[~]''')
+simple_url_re = re.compile(r'''^https?://''')
+
+
+def sentenceTokens(sentence):
+    """Returns the tokens of an already tokenized sentence, runs of whitespace make no empty tokens"""
+    return sentence.split()
+
+
+class WhitespaceTokenizer(object):
+    """Makes one token of every word of sentenceTokens"""
+
+    def __init__(self, vocab):
+        self.vocab = vocab
+
+    def __call__(self, text):
+        return Doc(self.vocab, words=sentenceTokens(text))
+
+
+def whitespace_tokenizer(nlp):
+    """Returns the tokenizer for already tokenized lines, the parse cache knows it by its name"""
+    return WhitespaceTokenizer(nlp.vocab)
+
+
+def custom_tokenizer(nlp):
+    """Returns the former tokenizer of the rnn variants"""
+    return Tokenizer(nlp.vocab, prefix_search=prefix_re.search,
+                                suffix_search=suffix_re.search,
+                                infix_finditer=infix_re.finditer,
+                                token_match=simple_url_re.match)
+
+
+def loadParser(model='en', tokenizer=whitespace_tokenizer, pipes=parserPipes):
+    """Loads the spaCy model of this process with only the given pipes, None keeps all of them
+
+    tokenizer builds the tokenizer, None keeps the one of the model.
+    """
+    global nlp, loadedParser
+    nlp = spacy.load(model)
+    loadedParser = (model, tokenizer, pipes)
+    if pipes is not None:
+        nlp.disable_pipes(*[name for name in nlp.pipe_names if name not in pipes])
+    if tokenizer is not None:
+        nlp.tokenizer = tokenizer(nlp)
+
+
+def parseBatch(sentences):
+    """Parses a batch of sentences and returns the token heads of each of them"""
+    heads = []
+    for document in nlp.pipe([unicode(sentence) for sentence in sentences], batch_size=len(sentences)):
+        heads.append([token.head.i for token in document])
+    return heads
+
+
+def parseHeads(sentences, batchSize=1000, nProcess=1, model='en', tokenizer=whitespace_tokenizer):
+    """Returns for every sentence the list of head indices of its tokens, in input order"""
+    batches = [sentences[i:i+batchSize] for i in range(0, len(sentences), batchSize)]
+    heads = []
+
+    if nProcess <= 1:
+        if loadedParser != (model, tokenizer, parserPipes):
+            loadParser(model, tokenizer)
+        for batch in batches:
+            heads.extend(parseBatch(batch))
+        return heads
+
+    for batchHeads in parserPool(nProcess, model, tokenizer).imap(parseBatch, batches):
+        heads.extend(batchHeads)
+    return heads
+
+
+def parserPool(nProcess, model='en', tokenizer=whitespace_tokenizer):
+    """Returns the pool of parser processes for these settings, it is only started once"""
+    key = (nProcess, model, tokenizer)
+    if key not in pools:
+        pools[key] = multiprocessing.Pool(nProcess, loadParser, (model, tokenizer))
+    return pools[key]
+
+
+@atexit.register
+def closeParsers():
+    """Stops all pools of parser processes"""
+    for pool in pools.values():
+        pool.close()
+        pool.join()
+    pools.clear()
+
+
+def parserVersion(model='en', tokenizer=whitespace_tokenizer, pipes=parserPipes):
+    """Returns a name for the parser output, cached heads are only reused for the same name"""
+    version = 'spacy-%s-%s' % (spacy.__version__, model)
+    try:
+        meta = spacy.util.get_model_meta(os.path.join(spacy.util.get_data_path(), model))
+        version += '-%s' % meta['version']
+    except Exception:
+        pass
+    if tokenizer is not None:
+        version += '-%s' % tokenizer.__name__
+    if pipes is not None:
+        version += '-%s' % '+'.join(pipes)
+    return version
+
+
+def sentenceKey(sentence):
+    """Returns the content address of a sentence in the parse cache"""
+    return hashlib.sha1(unicode(sentence).encode('utf-8')).hexdigest()
+
+
+def packHeads(heads):
+    """Returns the heads of a sentence as they are kept in the parse cache"""
+    return np.asarray(heads, dtype='int32').tobytes()
+
+
+def unpackHeads(packed):
+    """Returns the heads of a sentence kept in the parse cache as a list"""
+    return np.frombuffer(packed, dtype='int32').tolist()
+
+
+def lockCache(cachePath):
+    """Returns the lock file of the cache, locked until it is closed"""
+    lock = open(cachePath + '.lock', 'a')
+    fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+    return lock
+
+
+def readCache(cachePath, cache):
+    """Adds the parses stored at cachePath to cache, returns False if the last member is truncated"""
+    f = gzip.open(cachePath, 'rb')
+    try:
+        while True:
+            parses = pkl.load(f)
+            #Caches written before kept the heads as lists
+            cache.update((key, heads if isinstance(heads, bytes) else packHeads(heads)) for key, heads in parses.items())
+    except EOFError:
+        #pickle ends with an EOFError at the end of the file too, only a truncated member fails again
+        try:
+            f.read(1)
+        except (EOFError, IOError, zlib.error):
+            return False
+        return True
+    except (IOError, zlib.error, pkl.UnpicklingError):
+        return False
+    finally:
+        f.close()
+
+
+def writeCache(cachePath, cache):
+    """Replaces the file at cachePath by a single member with all parses of cache"""
+    f = gzip.open(cachePath + '.tmp', 'wb')
+    pkl.dump(cache, f, pkl.HIGHEST_PROTOCOL)
+    f.close()
+    os.rename(cachePath + '.tmp', cachePath)
+
+
+def loadCache(cachePath):
+    """Returns the cache stored at cachePath, it is only read once per process"""
+    if cachePath not in caches:
+        cache = {}
+        if os.path.isfile(cachePath):
+            lock = lockCache(cachePath)
+            try:
+                if not readCache(cachePath, cache):
+                    #Members appended after a truncated one could not be read
+                    print("The parse cache %s is truncated, keep its %d complete parses" % (cachePath, len(cache)))
+                    writeCache(cachePath, cache)
+            finally:
+                lock.close()
+        caches[cachePath] = cache
+    return caches[cachePath]
+
+
+def saveCaches():
+    """Appends the new parses of every cache to its file"""
+    for cachePath in sorted(newParses):
+        folder = os.path.dirname(cachePath)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        member = io.BytesIO()
+        f = gzip.GzipFile(fileobj=member, mode='wb')
+        pkl.dump(newParses[cachePath], f, pkl.HIGHEST_PROTOCOL)
+        f.close()
+        lock = lockCache(cachePath)
+        try:
+            f = open(cachePath, 'ab')
+            f.write(member.getvalue())
+            f.close()
+        finally:
+            lock.close()
+    newParses.clear()
+
+
+def cachedParseHeads(sentences, batchSize=1000, nProcess=1, model='en', tokenizer=whitespace_tokenizer, cacheFolder='pkl/parses/', save=True):
+    """Same as parseHeads, but only sentences missing in the parse cache are parsed
+
+    With save=False new parses are only written by the next saveCaches().
+    """
+    cachePath = os.path.join(cacheFolder, parserVersion(model, tokenizer) + '.pkl.gz')
+    cache = loadCache(cachePath)
+
+    keys = [sentenceKey(sentence) for sentence in sentences]
+    missing = {}
+    for key, sentence in zip(keys, sentences):
+        if key not in cache and key not in missing:
+            missing[key] = sentence
+
+    if len(missing) > 0:
+        print("Parse %d of %d sentences" % (len(missing), len(sentences)))
+        missingKeys = list(missing.keys())
+        start = time.time()
+        heads = parseHeads([missing[key] for key in missingKeys], batchSize, nProcess, model, tokenizer)
+        print("Parsed at %.0f sentences/s" % (len(missingKeys) / max(time.time() - start, 1e-6)))
+        parses = dict(zip(missingKeys, [packHeads(sentenceHeads) for sentenceHeads in heads]))
+        cache.update(parses)
+        newParses.setdefault(cachePath, {}).update(parses)
+        if save:
+            saveCaches()
+
+    return [unpackHeads(cache[key]) for key in keys]
+
@@ -0,0 +1,12 @@
+"""
+The file preprocesses the files/train.txt and files/test.txt files.
+
+I requires the dependency based embeddings by Levy et al.. Download them from his website and change 
+the embeddingsPath variable in the script to point to the unzipped deps.words file.
+
+The variant and its settings are in preprocessing.py, 'python preprocessing.py'
+builds all variants in one pass.
+"""
+from preprocessing import preprocess
+
+preprocess(['sem-relations-med-dim'])
@@ -0,0 +1,551 @@
+"""
+One preprocessing pass for all variants of the dataset.
+
+The preprocess*.py scripts only differ in their embeddings, the tokenizer of the
+parser and the fields of their (labels, tokens, positions1, positions2,
+positionIndex, sdpWeights) sets. Each of them is a Variant here, its fields come
+from a list of feature extractors:
+
+    tokenField          the word ids of the sentence
+    positionField1/2    the distance buckets to the first/second entity
+    entityField         the one-hot blocks of both entities
+    entityWindowField   the one-hot blocks of both entities and their neighbours
+    sdpField            the weights of the shortest dependency path
+
+The entity-padded and SDP-only sets of the pi and rnn scripts are not stored, they
+are the views data.view('entity-padded') and data.view('sdp-only') of the
+sem-relations-low-dim and sem-relations-med-dim datasets. Lines whose text is longer than parseTokenBudget are not parsed, their path is the
+surface span between the entities and train_path_sources/test_path_sources of
+the dataset flag every line by the source of its path.
+
+preprocess() reads the files once for all the variants it is given: every line is
+split and hashed once, every text is parsed once per tokenizer, the words are
+looked up once per embeddings file and every variant then only builds its own
+fields. The lines and words of each run are kept in the datasets, a new run only
+reads the new or changed lines and only looks up their new words.
+
+PipelinedDataset preprocesses a new dataset in a producer process and hands the
+train set to the trainer chunk by chunk while it is parsed, so the first epoch
+runs while the parser is still busy.
+
+    python preprocessing.py                                         all variants
+    python preprocessing.py sem-relations-low-dim sem-relations-med-dim
+"""
+from __future__ import print_function
+import atexit
+import collections
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from parse import cachedParseHeads, saveCaches, closeParsers, parserVersion, sentenceTokens, whitespace_tokenizer
+from sdp import pairPaths, surfacePaths, parsedPath, surfacePath, noPath
+from vectors import loadEmbeddings, hasEmbeddingStore, gatherEmbeddings, growEmbeddings
+from dataset import hasDataset, loadDataset, saveDataset, padFields, raggedRows, pathWeights, Positions, Indicators
+from encode import lineChunks, lineHashes, knownLines, emptyColumns, mergeColumns, lineStarts, lineColumns, TokenTable, Vocabulary, \
+    pathColumns
+
+outputFolder = 'pkl/'
+
+#The embeddings file is read in chunks by a pool of worker processes, or gathered from
+#its binary store if it was converted with 'python vectors.py <embeddingsPath>'
+embeddingProcesses = 4
+#The embeddings are stored as float32, 'float16' halves them again
+embeddingDtype = 'float32'
+
+folder = 'files/'
+files = [folder+'train.txt', folder+'test.txt']
+lineSets = ['train_lines', 'test_lines']
+
+#Sentences are dependency parsed in batches over a pool of worker processes,
+#their heads are cached in parseCacheFolder and shared by all variants
+parseProcesses = 4
+parseBatchSize = 1000
+parseCacheFolder = 'pkl/parses/'
+
+#Texts with more than parseTokenBudget tokens are not parsed, their lines get the
+#surface span between the entities as path. The parse time of a text grows with its
+#length, so this bounds the time of every parse. None parses every text
+parseTokenBudget = 150
+
+#The files are read once in chunks of chunkLines lines, of every chunk only the
+#token numbers, entity positions and path columns are kept. They are spooled to a
+#folder in spoolFolder and stitched into one memory-mapped file per column once the
+#file is read, so reading a file holds a single chunk in memory
+chunkLines = 10000
+spoolFolder = 'pkl/spool/'
+#PipelinedDataset hands the train set to the trainer in chunks of streamLines lines, a
+#multiple of the batch size so a trainer that drops partial batches keeps every line
+streamLines = 1024
+
+#The lines of the last run are kept in the dataset with the sha1 of every line. A new
+#run only parses and encodes the new or changed lines and only looks up their new
+#words in the embeddings, word2Idx and wordEmbeddings only grow at the end. A run with
+#another parser version, tokenizer or parseTokenBudget builds the dataset again
+incremental = True
+
+#Mapping of the labels to integers
+labelsMapping = {'Other':0,
+                 'Message-Topic(e1,e2)':1, 'Message-Topic(e2,e1)':2,
+                 'Product-Producer(e1,e2)':3, 'Product-Producer(e2,e1)':4,
+                 'Instrument-Agency(e1,e2)':5, 'Instrument-Agency(e2,e1)':6,
+                 'Entity-Destination(e1,e2)':7, 'Entity-Destination(e2,e1)':8,
+                 'Cause-Effect(e1,e2)':9, 'Cause-Effect(e2,e1)':10,
+                 'Component-Whole(e1,e2)':11, 'Component-Whole(e2,e1)':12,
+                 'Entity-Origin(e1,e2)':13, 'Entity-Origin(e2,e1)':14,
+                 'Member-Collection(e1,e2)':15, 'Member-Collection(e2,e1)':16,
+                 'Content-Container(e1,e2)':17, 'Content-Container(e2,e1)':18}
+
+minDistance = -30
+maxDistance = 30
+
+
+def tokenField(columns, word2Idx, width):
+    """Sequences are stored ragged, without the padding up to width"""
+    return raggedRows(columns['tokens'], columns['lengths'], width)
+
+
+def positionField1(columns, word2Idx, width):
+    """The distance buckets are derived from pos1, pos2 and lengths when they are read"""
+    return Positions(columns['pos1'], columns['lengths'], width, minDistance, maxDistance)
+
+
+def positionField2(columns, word2Idx, width):
+    """Same as positionField1 for the second entity"""
+    return Positions(columns['pos2'], columns['lengths'], width, minDistance, maxDistance)
+
+
+def entityField(columns, word2Idx, width):
+    """The entity indicators are derived from pos1 and pos2 when they are read"""
+    return Indicators([columns['pos1'], columns['pos2']], [0, 0], width)
+
+
+def entityWindowField(columns, word2Idx, width):
+    """The indicators of both entities and of the tokens next to them"""
+    pos1, pos2 = columns['pos1'], columns['pos2']
+    return Indicators([pos1, pos2, pos1, pos1, pos2, pos2], [0, 0, -1, 1, -1, 1], width)
+
+
+def sdpField(columns, word2Idx, width):
+    """Only the token columns of the paths are stored, the weights are scattered when they are read"""
+    return pathWeights(columns['paths'], columns['pathLengths'], columns['pos1'], columns['pos2'], columns['lengths'], width)
+
+
+class Variant(collections.namedtuple('Variant', ['embeddingsPath', 'tokenizer', 'extractors'])):
+    """A preprocessed dataset: its embeddings, the tokenizer of its parses and the extractors of its set fields"""
+
+
+#We download English word embeddings from here https://www.cs.york.ac.uk/nlp/extvec/
+variants = {
+    'sem-relations': Variant('embeddings/wiki_extvec.gz', whitespace_tokenizer,
+                             [tokenField, positionField1, positionField2, entityField, sdpField]),
+    'sem-relations-low-dim': Variant('embeddings/glove.6B.50d.txt', whitespace_tokenizer,
+                                     [tokenField, positionField1, positionField2, entityWindowField, sdpField]),
+    #The sdp-only view of it is the set of rnn_med_dim_sdp.py
+    'sem-relations-med-dim': Variant('embeddings/glove.6B.200d.txt', whitespace_tokenizer,
+                                     [tokenField, positionField1, positionField2, entityWindowField, sdpField]),
+}
+
+
+def shortestDependencyPaths(lines, tokenizer=whitespace_tokenizer):
+    """Returns the path between the two entities of every line and its source, parsedPath, surfacePath or noPath"""
+    #Every text is parsed once, however many entity pairs refer to it
+    textIds = {}
+    lengths = [len(sentenceTokens(splits[3])) for splits in lines]
+    for splits, length in zip(lines, lengths):
+        if parseTokenBudget is None or length <= parseTokenBudget:
+            textIds.setdefault(splits[3], len(textIds))
+    texts = sorted(textIds, key=textIds.get)
+    heads = cachedParseHeads(texts, parseBatchSize, parseProcesses, tokenizer=tokenizer, cacheFolder=parseCacheFolder, save=False)
+
+    parsed = [splits for splits in lines if splits[3] in textIds]
+    parsedPaths = iter(pairPaths(heads, [textIds[splits[3]] for splits in parsed],
+                                 [int(splits[1]) for splits in parsed], [int(splits[2]) for splits in parsed]))
+    spans = surfacePaths([int(splits[1]) for splits in lines], [int(splits[2]) for splits in lines], lengths)
+    paths = []
+    sources = []
+    for splits, span in zip(lines, spans):
+        if splits[3] in textIds:
+            paths.append(next(parsedPaths))
+            sources.append(parsedPath if len(paths[-1]) > 0 else noPath)
+        else:
+            paths.append(span)
+            sources.append(surfacePath if len(span) > 0 else noPath)
+    return paths, np.array(sources, dtype='int64')
+
+
+#The line columns that depend on the tokenizer of the parse
+pathKeys = ['paths', 'pathLengths', 'pathSources']
+
+
+def entityColumns(lines):
+    """Returns the labels and the entity indices of the lines"""
+    return {'labels': np.array([labelsMapping[splits[0]] for splits in lines], dtype='int64'),
+            'pos1': np.array([int(splits[1]) for splits in lines], dtype='int64'),
+            'pos2': np.array([int(splits[2]) for splits in lines], dtype='int64')}
+
+
+def spoolArray(spool, parts, name, array):
+    """Saves the array of the next chunk of the column name in the spool folder, parts holds the paths of every column"""
+    paths = parts.setdefault(name, [])
+    path = os.path.join(spool, '%s.%d.npy' % (name, len(paths)))
+    np.save(path, array)
+    paths.append(path)
+
+
+def stitchArrays(spool, name, paths, empty):
+    """Returns the spooled chunks of a flat column as one array memory-mapped from the spool folder
+
+    empty is the column of no lines, the chunk files are removed once they are copied.
+    """
+    length = 0
+    dtype = empty.dtype
+    for path in paths:
+        part = np.load(path, mmap_mode='r')
+        length += len(part)
+        dtype = np.result_type(dtype, part.dtype)
+        del part
+    if length == 0:
+        return empty
+    target = os.path.join(spool, name + '.npy')
+    stitched = np.lib.format.open_memmap(target, mode='w+', dtype=dtype, shape=(length,))
+    start = 0
+    for path in paths:
+        part = np.load(path, mmap_mode='r')
+        stitched[start:start+len(part)] = part
+        start += len(part)
+        del part
+        os.remove(path)
+    stitched.flush()
+    del stitched
+    return np.load(target, mmap_mode='r')
+
+
+def readFile(file, tokenizers, tokenTable, words, known, spool):
+    """Reads the file once, chunk by chunk, and returns the columns of the new lines per tokenizer and where every line is
+
+    known holds for every variant the rows of the lines of its last run by their hash.
+    A line known to all of them is skipped, the others are read and the source of a
+    line for a variant is its known row or -1-row for its row in the returned columns.
+    The columns are memory-mapped from the spool folder.
+    """
+    parts = {}
+    newLines = 0
+    for chunk in lineChunks(file, chunkLines):
+        hashes = lineHashes(chunk)
+        rows = [np.array([variantKnown.get(lineHash, -1) for lineHash in hashes], dtype='int64') for variantKnown in known]
+        isNew = np.zeros(len(chunk), dtype=bool)
+        for variantRows in rows:
+            isNew |= variantRows < 0
+        newRows = newLines + np.cumsum(isNew) - 1
+        for idx, variantRows in enumerate(rows):
+            spoolArray(spool, parts, 'sources%d' % idx, np.where(variantRows >= 0, variantRows, -newRows - 1))
+        chunk = [splits for splits, new in zip(chunk, isNew) if new]
+        newLines += len(chunk)
+        if len(chunk) == 0:
+            continue
+
+        tokens = [sentenceTokens(splits[3]) for splits in chunk]
+        for sentence in tokens:
+            for token in sentence:
+                words[token.lower()] = True
+        columns = entityColumns(chunk)
+        columns['hashes'] = hashes[isNew]
+        columns['tokens'], columns['lengths'] = tokenTable.encode(tokens)
+        for key in lineColumns:
+            if key not in pathKeys:
+                spoolArray(spool, parts, key, columns[key])
+        for tokenizerIdx, tokenizer in enumerate(tokenizers):
+            paths, columns['pathSources'] = shortestDependencyPaths(chunk, tokenizer)
+            columns['paths'], columns['pathLengths'] = pathColumns(paths)
+            for key in pathKeys:
+                spoolArray(spool, parts, '%s%d' % (key, tokenizerIdx), columns[key])
+        #The parse cache is append-only, the parses of a chunk are written at once
+        saveCaches()
+
+    #Columns that do not depend on the tokenizer are the same arrays for all of them
+    empty = emptyColumns()
+    shared = dict((key, stitchArrays(spool, key, parts.get(key, []), empty[key])) for key in lineColumns if key not in pathKeys)
+    lines = {}
+    for tokenizerIdx, tokenizer in enumerate(tokenizers):
+        lines[tokenizer] = dict(shared)
+        for key in pathKeys:
+            name = '%s%d' % (key, tokenizerIdx)
+            lines[tokenizer][key] = stitchArrays(spool, name, parts.get(name, []), empty[key])
+    sources = []
+    for idx in range(len(known)):
+        name = 'sources%d' % idx
+        sources.append(stitchArrays(spool, name, parts.get(name, []), np.zeros(0, dtype='int64')))
+    return lines, sources
+
+
+def mergeFile(previous, current, source, tokenIds, spool):
+    """Returns the columns of all lines of a file, merged chunkLines lines at a time into the spool folder
+
+    Line i is row source[i] of previous or row -source[i]-1 of current, tokenIds
+    maps the tokens of current to word ids. The columns are memory-mapped.
+    """
+    starts = [lineStarts(previous), lineStarts(current)]
+    parts = {}
+    for start in range(0, len(source), chunkLines):
+        merged = mergeColumns(previous, current, source[start:start+chunkLines], starts, tokenIds)
+        for key in lineColumns:
+            spoolArray(spool, parts, key, merged[key])
+    empty = emptyColumns()
+    return dict((key, stitchArrays(spool, key, parts.get(key, []), empty[key])) for key in lineColumns)
+
+
+def pathSettings(tokenizer):
+    """Returns the settings the paths of the lines depend on"""
+    return {'parser': parserVersion(tokenizer=tokenizer), 'parseTokenBudget': parseTokenBudget}
+
+
+def previousRun(outputFilePath, tokenizer):
+    """Returns the dataset of the last run at outputFilePath if it kept its lines and found their paths the same way, else None"""
+    if not incremental or not hasDataset(outputFilePath):
+        return None
+    previous = loadDataset(outputFilePath)
+    if 'train_lines' not in previous or len(previous['train_lines']) != len(lineColumns):
+        return None
+    if 'path_settings' not in previous or previous['path_settings'] != pathSettings(tokenizer):
+        print("The paths of", outputFilePath, "were found with other parser settings, build it again")
+        return None
+    return previous
+
+
+def downloadEmbeddings(embeddingsPath):
+    """Downloads the embeddings from the York webserver if they are missing"""
+    if not os.path.isfile(embeddingsPath) and not hasEmbeddingStore(embeddingsPath):
+        basename = os.path.basename(embeddingsPath)
+        if basename == 'wiki_extvec.gz':
+            print("Start downloading word embeddings for English using wget ...")
+            #os.system("wget https://www.cs.york.ac.uk/nlp/extvec/"+basename+" -P embeddings/")
+            os.system("wget https://public.ukp.informatik.tu-darmstadt.de/reimers/2017_english_embeddings/"+basename+" -P embeddings/")
+        else:
+            print(embeddingsPath, "does not exist. Please provide pre-trained embeddings")
+            exit()
+
+
+def readEmbeddings(embeddingsPath, words):
+    """Returns word2Idx and the embedding matrix for the words"""
+    downloadEmbeddings(embeddingsPath)
+    print("Load pre-trained embeddings file", embeddingsPath)
+    if hasEmbeddingStore(embeddingsPath):
+        return gatherEmbeddings(embeddingsPath, words)
+    return loadEmbeddings(embeddingsPath, words, embeddingProcesses)
+
+
+def preprocess(names, embeddings=None):
+    """Preprocesses files into the datasets of the given variants, all of them in one pass over the files
+
+    embeddings maps embeddings files that were already read for all words of the
+    files to their word2Idx and wordEmbeddings.
+    """
+    names = list(names)
+    outputs = [outputFolder + name for name in names]
+    previous = [previousRun(outputFilePath, variants[name].tokenizer) for name, outputFilePath in zip(names, outputs)]
+    previousColumns = [[dict(zip(lineColumns, run[key])) if run is not None else emptyColumns() for key in lineSets] for run in previous]
+    previousWords = [run['words'] if run is not None else {} for run in previous]
+
+    tokenizers = []
+    for name in names:
+        if variants[name].tokenizer not in tokenizers:
+            tokenizers.append(variants[name].tokenizer)
+
+    #The spool of a run that fails is removed when the process exits
+    if not os.path.isdir(spoolFolder):
+        os.makedirs(spoolFolder)
+    spool = tempfile.mkdtemp(dir=spoolFolder)
+    atexit.register(shutil.rmtree, spool, True)
+    tokenTable = TokenTable()
+    words = {}
+    fileLines = []
+    fileSources = []
+    for fileIdx in range(len(files)):
+        lines, sources = readFile(files[fileIdx], tokenizers, tokenTable, words,
+                                  [knownLines(columns[fileIdx]['hashes']) for columns in previousColumns],
+                                  tempfile.mkdtemp(dir=spool))
+        print("New or changed lines in %s: %d, %d of them not parsed" % (files[fileIdx], len(lines[tokenizers[0]]['labels']),
+                                                                        np.sum(lines[tokenizers[0]]['pathSources'] == surfacePath)))
+        fileLines.append(lines)
+        fileSources.append(sources)
+    saveCaches()
+
+    # :: Read in word embeddings ::
+    #Every embeddings file is read once for the new words of all variants that use it
+    newWords = [dict((word, True) for word in words if word not in variantWords) for variantWords in previousWords]
+    embeddingWords = {}
+    for idx, name in enumerate(names):
+        embeddingsPath = variants[name].embeddingsPath
+        if previous[idx] is None or len(newWords[idx]) > 0:
+            embeddingWords.setdefault(embeddingsPath, {}).update(newWords[idx])
+    embeddings = dict(embeddings or {})
+    for embeddingsPath in embeddingWords:
+        if embeddingsPath not in embeddings:
+            embeddings[embeddingsPath] = readEmbeddings(embeddingsPath, embeddingWords[embeddingsPath])
+
+    tokenIds = {}
+    for idx, name in enumerate(names):
+        variant = variants[name]
+        if previous[idx] is None:
+            word2Idx, wordEmbeddings = embeddings[variant.embeddingsPath]
+        elif len(newWords[idx]) == 0:
+            print("No new words, keep the embeddings of", outputs[idx])
+            word2Idx, wordEmbeddings = previous[idx]['word2Idx'], previous[idx]['wordEmbeddings']
+        else:
+            #Existing words keep their index, the new ones are appended
+            word2Idx, wordEmbeddings = growEmbeddings(previous[idx]['word2Idx'], previous[idx]['wordEmbeddings'],
+                                                      *embeddings[variant.embeddingsPath])
+        allWords = dict(previousWords[idx])
+        allWords.update(words)
+
+        print(name)
+        print("Embeddings shape: ", wordEmbeddings.shape)
+        print("Len words: ", len(allWords))
+
+        # :: Merge the new lines with the ones of the last run ::
+        #Variants that read the same embeddings share the word ids of the tokens
+        key = variant.embeddingsPath if previous[idx] is None else name
+        if key not in tokenIds:
+            tokenIds[key] = tokenTable.mapping(word2Idx)
+        fileColumns = [mergeFile(previousColumns[idx][fileIdx], fileLines[fileIdx][variant.tokenizer], fileSources[fileIdx][idx],
+                                 tokenIds[key], tempfile.mkdtemp(dir=spool)) for fileIdx in range(len(files))]
+
+        # :: Create token matrix ::
+        maxSentenceLen = [int(np.max(columns['lengths'])) for columns in fileColumns]
+        print("Max Sentence Lengths: ", maxSentenceLen)
+        sets = [(columns['labels'],) + tuple(extractor(columns, word2Idx, max(maxSentenceLen)) for extractor in variant.extractors)
+                for columns in fileColumns]
+
+        data = {'wordEmbeddings': wordEmbeddings.astype(embeddingDtype), 'word2Idx': word2Idx,
+                'train_set': sets[0], 'test_set': sets[1]}
+
+        #The lines and words of this run, for the next incremental run
+        data['words'] = allWords
+        data['path_settings'] = pathSettings(variant.tokenizer)
+        for fileIdx, key in enumerate(lineSets):
+            data[key] = tuple(fileColumns[fileIdx][column] for column in lineColumns)
+        #Whether the path of every line was parsed, approximated or not found
+        data['train_path_sources'], data['test_path_sources'] = [columns['pathSources'] for columns in fileColumns]
+
+        saveDataset(outputs[idx], data)
+
+        print("Data stored in", outputs[idx])
+
+    shutil.rmtree(spool, ignore_errors=True)
+
+
+def scanFiles():
+    """Returns the lowercased words of the files and their longest sentence, without parsing them"""
+    words = {}
+    maxSentenceLen = 0
+    for file in files:
+        for lines in lineChunks(file, chunkLines):
+            for splits in lines:
+                tokens = sentenceTokens(splits[3])
+                maxSentenceLen = max(maxSentenceLen, len(tokens))
+                for token in tokens:
+                    words[token.lower()] = True
+    return words, maxSentenceLen
+
+
+def streamSets(name, queue, streamLines=streamLines):
+    """Producer of PipelinedDataset, puts the embeddings and then the padded train set chunk by chunk on the queue
+
+    Once the train file is parsed the dataset is stored with the same embeddings,
+    its parses are already in the parse cache of this process.
+    """
+    variant = variants[name]
+    words, maxSentenceLen = scanFiles()
+    word2Idx, wordEmbeddings = readEmbeddings(variant.embeddingsPath, words)
+    queue.put((word2Idx, wordEmbeddings.astype(embeddingDtype), maxSentenceLen))
+
+    vocabulary = Vocabulary(word2Idx)
+    for lines in lineChunks(files[0], streamLines):
+        columns = entityColumns(lines)
+        tokenIds, columns['lengths'] = vocabulary.encode([sentenceTokens(splits[3]) for splits in lines])
+        #The stored dataset widens the word ids to int64 when they are read
+        columns['tokens'] = tokenIds.astype('int64')
+        paths, columns['pathSources'] = shortestDependencyPaths(lines, variant.tokenizer)
+        saveCaches()
+        columns['paths'], columns['pathLengths'] = pathColumns(paths)
+        queue.put(padFields((columns['labels'],) + tuple(extractor(columns, word2Idx, maxSentenceLen) for extractor in variant.extractors)))
+    queue.put(None)
+
+    preprocess([name], {variant.embeddingsPath: (word2Idx, wordEmbeddings)})
+    closeParsers()
+
+
+class PipelinedDataset(object):
+    """Trains on a new dataset while it is preprocessed
+
+    A producer process reads the embeddings, then parses the train file chunk by
+    chunk and puts the padded train set of every chunk on a bounded queue, at most
+    queueChunks of them wait for the trainer. chunks() yields them the first time
+    and afterwards the train set of the stored dataset in chunks of streamLines rows.
+    All fields are read from the stored dataset, once the producer stored it.
+
+    streamLines should be a multiple of the batch size of the trainer, a trainer that
+    drops the last partial batch of every chunk would otherwise skip lines.
+
+    word2Idx, wordEmbeddings and width, the longest sentence, are known at once.
+    """
+
+    def __init__(self, name, queueChunks=4, streamLines=streamLines):
+        self.outputFilePath = outputFolder + name
+        self.streamLines = streamLines
+        self.data = None
+        self.producer = None
+        if hasDataset(self.outputFilePath):
+            self.data = loadDataset(self.outputFilePath)
+            self.word2Idx, self.wordEmbeddings = self.data['word2Idx'], self.data['wordEmbeddings']
+            self.width = self.data.ragged('train_set')[2].width
+            return
+
+        self.queue = multiprocessing.Queue(queueChunks)
+        self.producer = multiprocessing.Process(target=streamSets, args=(name, self.queue, streamLines))
+        self.producer.start()
+        self.word2Idx, self.wordEmbeddings, self.width = self.queue.get()
+
+    def chunks(self):
+        """Yields the train set in chunks of padded fields"""
+        if self.data is None:
+            sets = self.queue.get()
+            while sets is not None:
+                yield sets
+                sets = self.queue.get()
+            self.queue = None
+            self.join()
+            return
+        trainSet = self.data['train_set']
+        for start in range(0, len(trainSet[0]), self.streamLines):
+            yield tuple(field[start:start+self.streamLines] for field in trainSet)
+
+    def join(self):
+        """Waits until the producer stored the dataset and opens it"""
+        if self.data is not None:
+            return
+        #Chunks nobody asked for would block the producer
+        while self.queue is not None and self.queue.get() is not None:
+            pass
+        self.queue = None
+        self.producer.join()
+        if self.producer.exitcode != 0:
+            raise RuntimeError("Preprocessing %s failed with exit code %d" % (self.outputFilePath, self.producer.exitcode))
+        self.data = loadDataset(self.outputFilePath)
+
+    def keys(self):
+        self.join()
+        return self.data.keys()
+
+    def __getitem__(self, key):
+        self.join()
+        return self.data[key]
+
+
+if __name__ == '__main__':
+    preprocess(sys.argv[1:] if len(sys.argv) > 1 else sorted(variants))
@@ -0,0 +1,78 @@
+"""
+Pairwise ranking loss of CR-CNN (dos Santos et al., 2015) over the class scores of a batch.
+
+For the score s+ of the true class and the score s- of the best scoring wrong
+class every example costs
+
+    log(1 + exp(gamma*(positiveMargin - s+))) + log(1 + exp(gamma*(negativeMargin + s-)))
+
+s+ is gathered from the scores and s- is the max of the scores with the true class
+masked out, so time and memory grow linearly with the batch size. With an Other
+class, the examples of Other have no positive term and Other is never the wrong
+class of an example.
+
+RankingMetrics predicts with the same scores: the best scoring class, or Other
+when no class scores above a threshold. It keeps the predictions and confusion
+matrix of an epoch on the device, so the scores are only copied to the host
+once, by results().
+"""
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+
+class RankingLoss(nn.Module):
+    """Mean ranking loss of the (batch, classes) scores and the labels, other is the label of the Other class or None"""
+
+    def __init__(self, other=None, gamma=2.0, positiveMargin=2.5, negativeMargin=0.5):
+        super(RankingLoss, self).__init__()
+        self.other = other
+        self.gamma = gamma
+        self.positiveMargin = positiveMargin
+        self.negativeMargin = negativeMargin
+
+    def forward(self, scores, labels):
+        labels = labels.view(-1, 1)
+        positive = F.softplus(self.gamma * (self.positiveMargin - scores.gather(1, labels).view(-1)))
+
+        excluded = torch.zeros_like(scores).scatter_(1, labels, 1)
+        if self.other is not None:
+            positive = positive.masked_fill(labels.view(-1).eq(self.other), 0)
+            excluded.narrow(1, self.other, 1).fill_(1)
+        negative = torch.max(scores.masked_fill(excluded.byte(), -float('inf')), 1)[0]
+        negative = F.softplus(self.gamma * (self.negativeMargin + negative))
+        return torch.mean(positive + negative)
+
+
+class RankingMetrics(object):
+    """Predictions and confusion matrix of the batches of an epoch, on the device of their scores
+
+    Every example is predicted as its best scoring class, or as other if that score
+    is not above penalty. Without other the best scoring class is always taken.
+    """
+
+    def __init__(self, nClasses, other=None, penalty=0):
+        self.nClasses = nClasses
+        self.other = other
+        self.penalty = penalty
+        self.predictions = []
+        self.confusion = None
+
+    def add(self, scores, labels):
+        """Adds the predictions of the (batch, classes) scores of a batch with the labels, returns the predictions"""
+        value, prediction = torch.max(scores, 1)
+        if self.other is not None:
+            prediction = prediction.masked_fill(value <= self.penalty, self.other)
+        if self.confusion is None:
+            self.confusion = labels.new(self.nClasses*self.nClasses).zero_()
+        self.confusion.index_add_(0, labels*self.nClasses + prediction, torch.ones_like(labels))
+        self.predictions.append(prediction)
+        return prediction
+
+    def results(self):
+        """Returns the predictions of all batches in order and the confusion matrix, labels as rows, as numpy arrays"""
+        if self.confusion is None:
+            return np.zeros(0, dtype='int64'), np.zeros((self.nClasses, self.nClasses), dtype='int64')
+        values = torch.cat(self.predictions + [self.confusion]).cpu().numpy()
+        return values[:-len(self.confusion)], values[-len(self.confusion):].reshape(self.nClasses, self.nClasses)
@@ -4,12 +4,16 @@ np.random.seed(1337)  # for reproducibility
 import gzip
 
 
+import os
 import sys
 if (sys.version_info > (3, 0)):
     import pickle as pkl
 else: #Python 2.7 imports
     import cPickle as pkl
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from dataset import loadDataset, Batches
+
 
 batch_size = 64
 test_batch_size = 2717
@@ -25,11 +29,7 @@ log_interval = 10
 learning_rate = 1
 
 print("Load dataset")
-f1 = gzip.open('../pkl/sem-relations-rnn-low-dim.pkl.gz', 'rb')
-data = pkl.load(f1)
-f1.close()
-f2 = gzip.open('../pkl/sem-relations-low-dim.pkl.gz', 'rb')
-data_all = pkl.load(f2)
+data_all = loadDataset('../pkl/sem-relations-low-dim')
 
 embeddings = data_all['wordEmbeddings']
 yTrain, sentenceTrain, positionTrain1, positionTrain2, positionIndexTrain, sdpWeightTrain = data_all['train_set']
@@ -112,16 +112,8 @@ random.shuffle(indexes)
 test_indexes = range(sentenceTest.shape[0])
 random.shuffle(test_indexes)
 
-def generate(data, batch_size, indexes):    
-    data_for_batch = []
-    size = data.shape[0]/batch_size
-    #if data.shape[0]%batch_size != 0:
-    #    size += 1
-    #print(batch_size)
-    for i in range(size):
-        index_for_batch = indexes[batch_size*i:min(data.shape[0], batch_size*(i+1))]
-        data_for_batch.append(data[index_for_batch])
-    return data_for_batch 
+def generate(data, batch_size, indexes):
+    return Batches(data, batch_size, indexes)
 
 def train(epoch):
     model.train()
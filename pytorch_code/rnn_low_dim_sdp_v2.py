@@ -10,6 +10,8 @@ if (sys.version_info > (3, 0)):
 else: #Python 2.7 imports
     import cPickle as pkl
 
+from dataset import loadDataset, Batches
+
 
 batch_size = 64
 test_batch_size = 64
@@ -25,15 +27,14 @@ log_interval = 10
 learning_rate = 0.001
 
 print("Load dataset")
-f = gzip.open('pkl/sem-relations-rnn-low-dim.pkl.gz', 'rb')
-data = pkl.load(f)
-f.close()
+#The tokens on the shortest dependency path are derived from the low-dim dataset
+data = loadDataset('pkl/sem-relations-low-dim').view('sdp-only')
 
 embeddings = data['wordEmbeddings']
-yTrain, sentenceTrain, positionTrain1, positionTrain2, positionIndexTrain, sdpWeightTrain = data['train_set']
-yTest, sentenceTest, positionTest1, positionTest2, positionIndexTest, sdpWeightTrain  = data['test_set']
+yTrain, sentenceTrain, positionTrain1, positionTrain2, positionIndexTrain, sdpWeightTrain = data.ragged('train_set')
+yTest, sentenceTest, positionTest1, positionTest2, positionIndexTest, sdpWeightTrain  = data.ragged('test_set')
 
-max_position = max(np.max(positionTrain1), np.max(positionTrain2))+1
+max_position = max(positionTrain1.max(), positionTrain2.max())+1
 
 n_out = max(yTrain)+1
 max_sentence_len = sentenceTrain.shape[1]
@@ -101,12 +102,8 @@ indexes = range(sentenceTrain.shape[0])
 random.shuffle(indexes)
 test_indexes = range(sentenceTest.shape[0])
 random.shuffle(test_indexes)
-def generate(data, batch_size, indexes):    
-    data_for_batch = []
-    for i in range(data.shape[0]/batch_size):
-        index_for_batch = indexes[batch_size*i:min(data.shape[0], batch_size*(i+1))]
-        data_for_batch.append(data[index_for_batch])
-    return data_for_batch 
+def generate(data, batch_size, indexes):
+    return Batches(data, batch_size, indexes)
 
 
 def train(epoch):
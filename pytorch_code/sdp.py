@@ -0,0 +1,155 @@
+"""
+Shortest dependency paths over integer head arrays.
+
+A dependency parse is a tree (a forest if spaCy splits the text into several
+sentences), so the shortest path between two tokens is the walk from each of them
+up to their lowest common ancestor. The heads of a whole corpus are padded into
+one matrix, the depths, the ancestor tables and the lowest common ancestors of
+all entity pairs are then found with a few vectorized passes over it.
+
+Corpora like the SemEval-2018 abstracts ask for many entity pairs per text. Each
+text is parsed and tabled once and every pair just points to its text, so the
+cost grows with the number of texts and not with the number of pairs.
+
+Texts that are too long to parse get surfacePaths instead, the tokens from one
+entity to the other in sentence order.
+
+The paths are the same as the ones of nx.shortest_path on the undirected graph of
+the token.children edges: tokens without any edge are not in that graph and
+tokens in different trees are not connected, both give an empty path.
+"""
+from __future__ import print_function
+import numpy as np
+
+#How the path of an entity pair was found: from its parse, as the surface span
+#between the entities because its text was not parsed, or not at all
+parsedPath, surfacePath, noPath = 0, 1, 2
+
+
+def headMatrix(heads):
+    """Pads the head arrays into one matrix, padding tokens are their own head"""
+    maxLen = max([len(sentenceHeads) for sentenceHeads in heads] + [1])
+    matrix = np.tile(np.arange(maxLen), (len(heads), 1))
+    for row, sentenceHeads in enumerate(heads):
+        matrix[row, :len(sentenceHeads)] = sentenceHeads
+    return matrix
+
+
+def treeDepths(matrix):
+    """Returns the depth and the root of every token of the head matrix"""
+    rows = np.arange(matrix.shape[0]).reshape(-1, 1)
+    depth = np.zeros(matrix.shape, dtype='int64')
+    root = np.tile(np.arange(matrix.shape[1]), (matrix.shape[0], 1))
+    for _ in range(matrix.shape[1]):
+        parent = matrix[rows, root]
+        moved = parent != root
+        if not moved.any():
+            break
+        depth += moved
+        root = parent
+    return depth, root
+
+
+def ancestorTables(matrix):
+    """Returns the binary lifting tables of the head matrix, table k holds the 2^k-th ancestor of every token"""
+    rows = np.arange(matrix.shape[0]).reshape(-1, 1)
+    tables = [matrix]
+    while 2**len(tables) < matrix.shape[1]:
+        tables.append(tables[-1][rows, tables[-1]])
+    return tables
+
+
+def lowestCommonAncestors(tables, depth, root, textIds, pos1, pos2):
+    """Returns the lowest common ancestor of every entity pair, -1 if they are in different trees"""
+    node1 = np.array(pos1, dtype='int64')
+    node2 = np.array(pos2, dtype='int64')
+
+    #Lift the deeper entity to the depth of the other one
+    diff = depth[textIds, node1] - depth[textIds, node2]
+    for k, table in enumerate(tables):
+        lift1 = (diff > 0) & ((diff >> k) & 1 == 1)
+        lift2 = (diff < 0) & ((-diff >> k) & 1 == 1)
+        node1 = np.where(lift1, table[textIds, node1], node1)
+        node2 = np.where(lift2, table[textIds, node2], node2)
+
+    #Lift both as long as their ancestors differ, then the parent is the common one
+    for table in reversed(tables):
+        parent1 = table[textIds, node1]
+        parent2 = table[textIds, node2]
+        differ = parent1 != parent2
+        node1 = np.where(differ, parent1, node1)
+        node2 = np.where(differ, parent2, node2)
+    lca = np.where(node1 == node2, node1, tables[0][textIds, node1])
+
+    connected = root[textIds, pos1] == root[textIds, pos2]
+    return np.where(connected, lca, -1)
+
+
+def connectedTokens(matrix, lengths):
+    """Returns a mask of the tokens that have at least one dependency edge"""
+    tokens = np.arange(matrix.shape[1])
+    hasEdge = (matrix != tokens) & (tokens < np.reshape(lengths, (-1, 1)))
+    rows, children = np.nonzero(hasEdge)
+    hasEdge[rows, matrix[rows, children]] = True
+    return hasEdge
+
+
+def pairPaths(heads, textIds, pos1, pos2):
+    """Returns the shortest dependency path of every entity pair, textIds point each pair to its parse in heads
+
+    Every text is only processed once, no matter how many entity pairs refer to it.
+    The lowest common ancestor of a pair is found with the ancestor tables in
+    O(log depth), walking the path then takes O(depth).
+    """
+    if len(textIds) == 0:
+        return []
+    lengths = np.array([len(sentenceHeads) for sentenceHeads in heads])
+    textIds = np.array(textIds, dtype='int64')
+    pos1 = np.array(pos1, dtype='int64')
+    pos2 = np.array(pos2, dtype='int64')
+    valid = (pos1 >= 0) & (pos1 < lengths[textIds]) & (pos2 >= 0) & (pos2 < lengths[textIds])
+    source = np.where(valid, pos1, 0)
+    target = np.where(valid, pos2, 0)
+
+    matrix = headMatrix(heads)
+    depth, root = treeDepths(matrix)
+    lca = lowestCommonAncestors(ancestorTables(matrix), depth, root, textIds, source, target)
+    hasEdge = connectedTokens(matrix, lengths)
+    valid &= (lca >= 0) & hasEdge[textIds, source] & hasEdge[textIds, target]
+
+    paths = []
+    for pair in range(len(textIds)):
+        if not valid[pair]:
+            paths.append([])
+            continue
+        sentenceHeads = heads[textIds[pair]]
+        up = [int(source[pair])]
+        while up[-1] != lca[pair]:
+            up.append(sentenceHeads[up[-1]])
+        down = [int(target[pair])]
+        while down[-1] != lca[pair]:
+            down.append(sentenceHeads[down[-1]])
+        paths.append(up + down[-2::-1])
+    return paths
+
+
+def surfacePaths(pos1, pos2, lengths):
+    """Returns the tokens from pos1 to pos2 of every sentence, an empty path if an entity is outside the sentence"""
+    paths = []
+    for source, target, length in zip(pos1, pos2, lengths):
+        if 0 <= source < length and 0 <= target < length:
+            step = 1 if target >= source else -1
+            paths.append(list(range(int(source), int(target) + step, step)))
+        else:
+            paths.append([])
+    return paths
+
+
+def dependencyPaths(heads, pos1, pos2):
+    """Returns the shortest dependency path between pos1 and pos2 for every sentence"""
+    return pairPaths(heads, range(len(heads)), pos1, pos2)
+
+
+def shortestDependencyPath(pos1, pos2, heads):
+    """Returns the shortest dependency path between pos1 and pos2 of a single sentence"""
+    return dependencyPaths([heads], [int(pos1)], [int(pos2)])[0]
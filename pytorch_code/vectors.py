@@ -0,0 +1,226 @@
+"""
+Chunked parallel loader for text embedding files like wiki_extvec.gz or glove.6B.50d.txt.
+
+The file is read in large chunks cut at line ends. The chunks are handed to a pool
+of worker processes which keep only the lines whose word is in the corpus
+vocabulary and convert all of their numbers in one vectorized call. At most two
+chunks per worker are in flight, so memory stays bounded for multi-GB files.
+
+The result is the same word2Idx and wordEmbeddings as reading the file line by
+line: PADDING_TOKEN and UNKNOWN_TOKEN first, then every matching line in file order.
+
+As every run only keeps a few thousand words of the file, the file can also be
+converted once into a binary store: a raw float32 matrix with one row per line
+of the file and a pickled vocabulary index. The matrix is memory-mapped, so a
+run only reads the rows it gathers and several processes share the page cache.
+The index records the size and modification time of the file it was converted
+from, a store that no longer matches its file is not used.
+
+    python vectors.py embeddings/wiki_extvec.gz
+"""
+from __future__ import print_function
+import collections
+import gzip
+import multiprocessing
+import os
+import sys
+if (sys.version_info > (3, 0)):
+    import pickle as pkl
+else: #Python 2.7 imports
+    import cPickle as pkl
+
+import numpy as np
+
+corpusWords = None
+
+
+def setCorpusWords(words):
+    """Sets the vocabulary the chunks are filtered against in this process"""
+    global corpusWords
+    corpusWords = words
+
+
+def readChunks(f, chunkSize):
+    """Yields chunks of about chunkSize bytes that end at a line end"""
+    while True:
+        chunk = f.read(chunkSize)
+        if not chunk:
+            break
+        yield chunk + f.readline()
+
+
+def filterChunk(chunk):
+    """Returns the words of the chunk that are in the corpus vocabulary and their vectors, all of them without vocabulary"""
+    chunkWords = []
+    numbers = []
+    for line in chunk.decode('utf-8').split('\n'):
+        split = line.strip().split(" ", 1)
+        if len(split) == 2 and (corpusWords is None or split[0].lower() in corpusWords):
+            chunkWords.append(split[0])
+            numbers.append(split[1])
+
+    if len(chunkWords) == 0:
+        return chunkWords, None
+    vectors = np.array(" ".join(numbers).split(), dtype='float64')
+    return chunkWords, vectors.reshape(len(chunkWords), -1)
+
+
+def scanEmbeddings(embeddingsPath, words, addChunk, nProcess=4, chunkSize=2**26):
+    """Filters the embeddings file chunk by chunk, addChunk gets the words and vectors in file order. Returns the dimension"""
+    fEmbeddings = gzip.open(embeddingsPath, 'rb') if embeddingsPath.endswith('.gz') else open(embeddingsPath, 'rb')
+    firstLine = fEmbeddings.readline()
+    dims = len(firstLine.decode('utf-8').strip().split(" "))-1
+
+    chunks = readChunks(fEmbeddings, chunkSize)
+    if nProcess <= 1:
+        setCorpusWords(words)
+        addChunk(*filterChunk(firstLine))
+        for chunk in chunks:
+            addChunk(*filterChunk(chunk))
+    else:
+        pool = multiprocessing.Pool(nProcess, setCorpusWords, (words,))
+        try:
+            pending = collections.deque([pool.apply_async(filterChunk, (firstLine,))])
+            for chunk in chunks:
+                pending.append(pool.apply_async(filterChunk, (chunk,)))
+                if len(pending) >= 2*nProcess:
+                    addChunk(*pending.popleft().get())
+            while len(pending) > 0:
+                addChunk(*pending.popleft().get())
+        finally:
+            pool.close()
+            pool.join()
+    fEmbeddings.close()
+    return dims
+
+
+def specialEmbeddings(dims, dtype='float64'):
+    """Returns word2Idx and the vectors of the PADDING_TOKEN and UNKNOWN_TOKEN"""
+    word2Idx = {}
+    word2Idx["PADDING_TOKEN"] = len(word2Idx)
+    padding = np.zeros((1, dims)) #Zero vector vor 'PADDING' word
+    word2Idx["UNKNOWN_TOKEN"] = len(word2Idx)
+    unknown = np.random.uniform(-0.25, 0.25, (1, dims))
+    return word2Idx, [padding.astype(dtype), unknown.astype(dtype)]
+
+
+def loadEmbeddings(embeddingsPath, words, nProcess=4, chunkSize=2**26):
+    """Returns word2Idx and the embedding matrix for the words of the corpus"""
+    chunks = []
+    def addChunk(chunkWords, vectors):
+        chunks.append((chunkWords, vectors))
+
+    dims = scanEmbeddings(embeddingsPath, words, addChunk, nProcess, chunkSize)
+
+    word2Idx, wordEmbeddings = specialEmbeddings(dims)
+    for chunkWords, vectors in chunks:
+        for word in chunkWords:
+            word2Idx[word] = len(word2Idx)
+        if vectors is not None:
+            wordEmbeddings.append(vectors)
+    return word2Idx, np.concatenate(wordEmbeddings, axis=0)
+
+
+def storePaths(embeddingsPath):
+    """Returns the paths of the float32 matrix and the vocabulary index of the binary store"""
+    base = embeddingsPath
+    for extension in ['.gz', '.txt']:
+        if base.endswith(extension):
+            base = base[:-len(extension)]
+    return base + '.f32', base + '.vocab.pkl'
+
+
+def sourceStamp(embeddingsPath):
+    """Returns the size and modification time of the embeddings file"""
+    stat = os.stat(embeddingsPath)
+    return stat.st_size, int(stat.st_mtime)
+
+
+def hasEmbeddingStore(embeddingsPath):
+    """Returns whether the embeddings file was converted into a binary store that is still up to date
+
+    Without the embeddings file any store is used.
+    """
+    vectorsPath, indexPath = storePaths(embeddingsPath)
+    if not os.path.isfile(vectorsPath) or not os.path.isfile(indexPath):
+        return False
+    if not os.path.isfile(embeddingsPath):
+        return True
+    f = open(indexPath, 'rb')
+    header = pkl.load(f)
+    f.close()
+    if header.get('source') != sourceStamp(embeddingsPath):
+        print("Ignore the embedding store of %s, it does not match the file, run vectors.py again" % embeddingsPath)
+        return False
+    return True
+
+
+def convertEmbeddings(embeddingsPath, nProcess=4, chunkSize=2**26):
+    """Converts a text embeddings file once into the binary store"""
+    vectorsPath, indexPath = storePaths(embeddingsPath)
+    stamp = sourceStamp(embeddingsPath)
+    vocab = []
+    fVectors = open(vectorsPath, 'wb')
+    def addChunk(chunkWords, vectors):
+        vocab.extend(chunkWords)
+        if vectors is not None:
+            vectors.astype('float32').tofile(fVectors)
+
+    dims = scanEmbeddings(embeddingsPath, None, addChunk, nProcess, chunkSize)
+    fVectors.close()
+
+    rows = {}
+    for row, word in enumerate(vocab):
+        rows.setdefault(word.lower(), []).append(row)
+    f = open(indexPath, 'wb')
+    #The stamp comes first, so hasEmbeddingStore does not read the whole index
+    pkl.dump({'source': stamp}, f, pkl.HIGHEST_PROTOCOL)
+    pkl.dump({'dims': dims, 'vocab': vocab, 'rows': rows}, f, pkl.HIGHEST_PROTOCOL)
+    f.close()
+    print("Stored %d vectors of %d dims in %s" % (len(vocab), dims, vectorsPath))
+
+
+def openEmbeddingStore(embeddingsPath):
+    """Returns the vocabulary index and the memory-mapped matrix of the binary store"""
+    vectorsPath, indexPath = storePaths(embeddingsPath)
+    f = open(indexPath, 'rb')
+    index = pkl.load(f)
+    #Stores converted before have no stamp in front of the index
+    if 'vocab' not in index:
+        index = pkl.load(f)
+    f.close()
+    matrix = np.memmap(vectorsPath, dtype='float32', mode='r', shape=(len(index['vocab']), index['dims']))
+    return index, matrix
+
+
+def gatherEmbeddings(embeddingsPath, words):
+    """Same as loadEmbeddings, but only the needed rows are read from the binary store, as float32"""
+    index, matrix = openEmbeddingStore(embeddingsPath)
+    rows = []
+    for word in words:
+        rows.extend(index['rows'].get(word, []))
+    rows.sort()
+
+    word2Idx, wordEmbeddings = specialEmbeddings(index['dims'], 'float32')
+    for row in rows:
+        word2Idx[index['vocab'][row]] = len(word2Idx)
+    wordEmbeddings.append(np.asarray(matrix[rows]))
+    return word2Idx, np.concatenate(wordEmbeddings, axis=0)
+
+
+def growEmbeddings(word2Idx, wordEmbeddings, newWord2Idx, newEmbeddings):
+    """Appends the words of newWord2Idx missing in word2Idx and their vectors, the indices of all other words stay the same"""
+    word2Idx = dict(word2Idx)
+    rows = []
+    for word, idx in sorted(newWord2Idx.items(), key=lambda item: item[1]):
+        if word not in word2Idx:
+            word2Idx[word] = len(wordEmbeddings) + len(rows)
+            rows.append(idx)
+    if len(rows) == 0:
+        return word2Idx, wordEmbeddings
+    return word2Idx, np.concatenate((wordEmbeddings, np.asarray(newEmbeddings)[rows].astype(wordEmbeddings.dtype)), axis=0)
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        convertEmbeddings(path)